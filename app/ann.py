@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import math
+from typing import Tuple
+
+import numpy as np
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    if top_k >= len(scores):
+        return np.argsort(-scores)
+    top_indices = np.argpartition(-scores, top_k)[:top_k]
+    return top_indices[np.argsort(-scores[top_indices])]
+
+
+def top_k_rows(scores: np.ndarray, top_k: int) -> np.ndarray:
+    # Row-wise version of top_k_indices for a (queries, rows) score matrix.
+    if top_k >= scores.shape[1]:
+        return np.argsort(-scores, axis=1)
+    part = np.argpartition(-scores, top_k, axis=1)[:, :top_k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    return np.take_along_axis(part, np.argsort(-part_scores, axis=1), axis=1)
+
+
+def _assign(embeddings: np.ndarray, centroids: np.ndarray, block_size: int = 8192) -> np.ndarray:
+    labels = np.empty(len(embeddings), dtype=np.int32)
+    for start in range(0, len(embeddings), block_size):
+        block = embeddings[start:start + block_size]
+        labels[start:start + block_size] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def train_centroids(embeddings: np.ndarray, nlist: int, iterations: int = 20, seed: int = 42) -> np.ndarray:
+    # Spherical k-means: embeddings are L2-normalised, so centroids are re-normalised after every update.
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(embeddings), nlist * 256)
+    sample = embeddings[rng.choice(len(embeddings), size=sample_size, replace=False)].astype(np.float32)
+    centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()), replace=False)]
+        lengths = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(lengths, 1e-12)
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, row_ids: np.ndarray) -> None:
+        self.centroids = centroids
+        self.offsets = offsets
+        self.row_ids = row_ids
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, nlist: int | None = None, seed: int = 42) -> "IVFIndex":
+        if not nlist:
+            nlist = max(1, int(math.sqrt(len(embeddings))))
+        nlist = min(nlist, len(embeddings))
+        centroids = train_centroids(embeddings, nlist, seed=seed)
+        labels = _assign(embeddings, centroids)
+        row_ids = np.argsort(labels, kind="stable").astype(np.int64)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=nlist), out=offsets[1:])
+        return cls(centroids.astype(np.float32), offsets, row_ids)
+
+    def save(self, path: str) -> None:
+        np.savez(path, centroids=self.centroids, offsets=self.offsets, row_ids=self.row_ids)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        data = np.load(path)
+        return cls(data["centroids"], data["offsets"], data["row_ids"])
+
+    def candidates(self, query_vec: np.ndarray, nprobe: int) -> np.ndarray:
+        lists = top_k_indices(self.centroids @ query_vec, min(nprobe, self.nlist))
+        return np.concatenate([self.row_ids[self.offsets[l]:self.offsets[l + 1]] for l in lists])
+
+    def search(self, embeddings: np.ndarray, query_vec: np.ndarray, top_k: int, nprobe: int) -> Tuple[np.ndarray, np.ndarray]:
+        rows = self.candidates(query_vec, nprobe)
+        scores = embeddings[rows] @ query_vec
+        order = top_k_indices(scores, top_k)
+        return rows[order], scores[order]
@@ -0,0 +1,686 @@
+from __future__ import annotations
+
+import os
+import sys
+import time
+import random
+import argparse
+import json
+import shutil
+import hashlib
+import threading
+import tempfile
+import tracemalloc
+import multiprocessing as mp
+from typing import List, Dict, Callable
+
+import numpy as np
+
+from app.ann import IVFIndex, top_k_indices
+from app.bundles import resolve_index_dir
+from app.client import RetrievalClient
+from app.config import paths, index_cfg, server_cfg
+from app.data_utils import load_dataset, expand_training_pairs, records_with_context, build_context_text
+from app.dedup import near_duplicate_clusters, split_clusters
+from app.encoder import ENCODER_BACKENDS, EncoderPool, encode_corpus, load_encoder, new_encode_stats, parity_check, token_lengths
+from app.metadata_store import STORE_NAME, MetadataStore
+from app.quantize import QuantizedEmbeddings, load_matrix, truncate_normalize
+
+
+def sample_queries(n: int, seed: int = 42) -> List[str]:
+    df = load_dataset(paths.data_path)
+    questions = sorted({q for q, _ in expand_training_pairs(df)})
+    random.Random(seed).shuffle(questions)
+    return questions[:n]
+
+
+def load_embeddings(scale: int = 1, seed: int = 42) -> np.ndarray:
+    embeddings = np.load(os.path.join(resolve_index_dir(), "embeddings.npy")).astype(np.float32)
+    if scale <= 1:
+        return embeddings
+    # Simulate a larger corpus by tiling the real vectors with small noise, then re-normalising.
+    rng = np.random.default_rng(seed)
+    tiled = np.tile(embeddings, (scale, 1))
+    tiled[len(embeddings):] += rng.normal(0, 0.05, size=tiled[len(embeddings):].shape).astype(np.float32)
+    tiled /= np.linalg.norm(tiled, axis=1, keepdims=True)
+    return tiled
+
+
+def encode_queries(queries: List[str]) -> np.ndarray:
+    model = load_encoder()
+    return model.encode(queries, batch_size=64, convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
+
+
+def time_per_query(fn: Callable[[np.ndarray], np.ndarray], query_vecs: np.ndarray) -> tuple[List[np.ndarray], float, float]:
+    results: List[np.ndarray] = []
+    timings: List[float] = []
+    for q in query_vecs:
+        start = time.perf_counter()
+        results.append(fn(q))
+        timings.append((time.perf_counter() - start) * 1000)
+    return results, float(np.percentile(timings, 50)), float(np.percentile(timings, 95))
+
+
+def recall_at_k(reference: List[np.ndarray], candidate: List[np.ndarray]) -> float:
+    hits = sum(len(set(r.tolist()) & set(c.tolist())) for r, c in zip(reference, candidate))
+    return hits / max(1, sum(len(r) for r in reference))
+
+
+def ann_report(num_queries: int, top_k: int, scale: int, nprobes: List[int]) -> None:
+    embeddings = load_embeddings(scale)
+    query_vecs = encode_queries(sample_queries(num_queries))
+    exact, p50, p95 = time_per_query(lambda q: top_k_indices(embeddings @ q, top_k), query_vecs)
+    print(f"rows={len(embeddings)} dim={embeddings.shape[1]} queries={len(query_vecs)} top_k={top_k}")
+    print(f"{'method':<16}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    print(f"{'exact':<16}{1.0:>10.3f}{p50:>10.3f}{p95:>10.3f}")
+    start = time.perf_counter()
+    ivf = IVFIndex.build(embeddings, nlist=index_cfg.ivf_nlist)
+    print(f"(IVF build: {ivf.nlist} lists in {time.perf_counter() - start:.1f}s)")
+    for nprobe in nprobes:
+        approx, p50, p95 = time_per_query(lambda q: ivf.search(embeddings, q, top_k, nprobe)[0], query_vecs)
+        print(f"{'ivf nprobe=' + str(nprobe):<16}{recall_at_k(exact, approx):>10.3f}{p50:>10.3f}{p95:>10.3f}")
+
+
+def quant_report(num_queries: int, top_k: int, scale: int, rescore: int) -> None:
+    embeddings = load_embeddings(scale)
+    query_vecs = encode_queries(sample_queries(num_queries))
+    exact, p50, p95 = time_per_query(lambda q: top_k_indices(embeddings @ q, top_k), query_vecs)
+    print(f"rows={len(embeddings)} dim={embeddings.shape[1]} queries={len(query_vecs)} top_k={top_k} rescore={rescore}")
+    print(f"{'format':<22}{'MB':>9}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    print(f"{'float32':<22}{embeddings.nbytes / 1e6:>9.1f}{1.0:>10.3f}{p50:>10.3f}{p95:>10.3f}")
+    for dtype in ("float16", "int8"):
+        compact = QuantizedEmbeddings.from_float(embeddings, dtype)
+        scan_only, p50, p95 = time_per_query(lambda q: top_k_indices(compact.scores(q), top_k), query_vecs)
+        print(f"{dtype + ' (no rescore)':<22}{compact.nbytes / 1e6:>9.1f}{recall_at_k(exact, scan_only):>10.3f}{p50:>10.3f}{p95:>10.3f}")
+
+        def rescored(q: np.ndarray) -> np.ndarray:
+            rows = top_k_indices(compact.scores(q), max(top_k, rescore))
+            return rows[top_k_indices(embeddings[rows] @ q, top_k)]
+
+        approx, p50, p95 = time_per_query(rescored, query_vecs)
+        print(f"{dtype + ' + rescore':<22}{compact.nbytes / 1e6:>9.1f}{recall_at_k(exact, approx):>10.3f}{p50:>10.3f}{p95:>10.3f}")
+
+
+def dims_report(num_queries: int, top_k: int, scale: int, dims: List[int], rescore: int) -> None:
+    # Reference is exact search at full dimension; reduced-dim vectors are truncated and re-normalised prefixes.
+    embeddings = load_embeddings(scale)
+    query_vecs = encode_queries(sample_queries(num_queries))
+    exact, p50, p95 = time_per_query(lambda q: top_k_indices(embeddings @ q, top_k), query_vecs)
+    full_dim = embeddings.shape[1]
+    print(f"rows={len(embeddings)} dim={full_dim} queries={len(query_vecs)} top_k={top_k} rescore={rescore}")
+    print(f"{'search':<18}{'MB':>9}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    print(f"{'full ' + str(full_dim):<18}{embeddings.nbytes / 1e6:>9.1f}{1.0:>10.3f}{p50:>10.3f}{p95:>10.3f}")
+    for dim in dims:
+        if dim >= full_dim:
+            continue
+        reduced = truncate_normalize(embeddings, dim)
+        # Each row holds the reduced query followed by the full one.
+        joint = np.hstack([truncate_normalize(query_vecs, dim), query_vecs])
+        first_pass, p50, p95 = time_per_query(lambda q: top_k_indices(reduced @ q[:dim], top_k), joint)
+        print(f"{f'd={dim}':<18}{reduced.nbytes / 1e6:>9.1f}{recall_at_k(exact, first_pass):>10.3f}{p50:>10.3f}{p95:>10.3f}")
+
+        def rescored(q: np.ndarray) -> np.ndarray:
+            rows = np.sort(top_k_indices(reduced @ q[:dim], max(top_k, rescore)))
+            return rows[top_k_indices(embeddings[rows] @ q[dim:], top_k)]
+
+        approx, p50, p95 = time_per_query(rescored, joint)
+        print(f"{f'd={dim} + rescore':<18}{reduced.nbytes / 1e6:>9.1f}{recall_at_k(exact, approx):>10.3f}{p50:>10.3f}{p95:>10.3f}")
+
+
+def dedup_report(thresholds: List[float], scale: int) -> None:
+    # "cosine" counts clusters by embedding alone; "canonical" after splitting them by answer and
+    # filter fields, which is what build_index keeps.
+    embeddings = load_embeddings(scale)
+    records = records_with_context(load_dataset(paths.data_path)) * scale
+    mode = "blocked" if len(embeddings) < index_cfg.ann_min_rows else "IVF-assisted"
+    print(f"rows={len(embeddings)} join={mode}")
+    print(f"{'threshold':>10}{'cosine':>9}{'canonical':>11}{'shrink':>9}{'largest':>9}{'seconds':>9}")
+    for threshold in thresholds:
+        start = time.perf_counter()
+        clusters = near_duplicate_clusters(embeddings, threshold)
+        canonical = split_clusters(records, clusters)
+        seconds = time.perf_counter() - start
+        cosine = int(np.count_nonzero(clusters == np.arange(len(clusters))))
+        kept = int(np.count_nonzero(canonical == np.arange(len(canonical))))
+        largest = int(np.bincount(canonical).max())
+        print(f"{threshold:>10.3f}{cosine:>9}{kept:>11}{1 - kept / len(canonical):>9.1%}{largest:>9}{seconds:>9.2f}")
+
+
+def _proc_memory_kb() -> Dict[str, int]:
+    # Linux only: RSS counts shared page-cache pages in every process, PSS splits them between sharers.
+    memory: Dict[str, int] = {}
+    with open("/proc/self/smaps_rollup", "r") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in {"Rss", "Pss"}:
+                memory[key] = int(rest.split()[0])
+    return memory
+
+
+def _rss_worker(path: str, mmap: bool, barrier, results) -> None:
+    baseline = _proc_memory_kb()
+    start = time.perf_counter()
+    embeddings = load_matrix(path, mmap)
+    open_ms = (time.perf_counter() - start) * 1000
+    query = np.ones(embeddings.shape[1], dtype=np.float32)
+    float(np.max(embeddings @ query))  # touch every page like a real search would
+    barrier.wait()  # measure while all workers hold the index
+    memory = _proc_memory_kb()
+    results.put((open_ms, (memory["Rss"] - baseline["Rss"]) / 1024, (memory["Pss"] - baseline["Pss"]) / 1024))
+    barrier.wait()
+
+
+def rss_report(workers: int) -> None:
+    path = os.path.join(resolve_index_dir(), "embeddings.npy")
+    print(f"{os.path.getsize(path) / 1e6:.1f} MB embeddings, {workers} workers")
+    print(f"{'mode':<8}{'open ms':>10}{'RSS MB/worker':>16}{'PSS MB/worker':>16}")
+    ctx = mp.get_context("spawn")
+    for mmap in (False, True):
+        barrier = ctx.Barrier(workers)
+        results = ctx.Queue()
+        procs = [ctx.Process(target=_rss_worker, args=(path, mmap, barrier, results)) for _ in range(workers)]
+        for proc in procs:
+            proc.start()
+        rows = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+        open_ms, rss, pss = (float(np.mean(col)) for col in zip(*rows))
+        print(f"{'mmap' if mmap else 'np.load':<8}{open_ms:>10.2f}{rss:>16.1f}{pss:>16.1f}")
+
+
+def metadata_report(hits: int) -> None:
+    index_dir = resolve_index_dir()
+    jsonl_path = os.path.join(index_dir, "metadata.jsonl")
+    store_dir = os.path.join(index_dir, STORE_NAME)
+    scratch = None
+    if not os.path.exists(jsonl_path):
+        # Builds only write metadata.jsonl with IndexConfig.metadata_jsonl; recreate it from the store.
+        scratch = tempfile.mkdtemp(prefix="metadata_bench_")
+        jsonl_path = os.path.join(scratch, "metadata.jsonl")
+        with open(jsonl_path, "w", encoding="utf-8") as f:
+            for r in MetadataStore(store_dir):
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+    def load_jsonl() -> List[Dict]:
+        with open(jsonl_path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    print(f"{'store':<10}{'open ms':>10}{'heap MB':>10}{'top-' + str(hits) + ' us':>12}")
+    for name, opener in (("jsonl", load_jsonl), ("columnar", lambda: MetadataStore(store_dir))):
+        tracemalloc.start()
+        start = time.perf_counter()
+        metadata = opener()
+        open_ms = (time.perf_counter() - start) * 1000
+        heap_mb = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+        rows = random.Random(0).sample(range(len(metadata)), hits)
+        start = time.perf_counter()
+        for row in rows:
+            metadata[row]
+        hit_us = (time.perf_counter() - start) * 1e6
+        print(f"{name:<10}{open_ms:>10.2f}{heap_mb:>10.2f}{hit_us:>12.1f}")
+    if scratch is not None:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def backend_report(backends: List[str], num_queries: int, top_k: int, threads: int | None) -> bool:
+    queries = sample_queries(num_queries)
+    embeddings = load_embeddings()
+    reference = load_encoder(backend="fp32", threads=threads)
+    passed = True
+    print(f"{'backend':<10}{'ms/query':>10}{'overlap@k':>11}{'top1 agree':>12}{'min cos':>9}")
+    for backend in backends:
+        model = reference if backend == "fp32" else load_encoder(backend=backend, threads=threads)
+        model.encode(queries[:8])  # warm-up (compilation, allocator)
+        timings: List[float] = []
+        for query in queries:
+            start = time.perf_counter()
+            model.encode([query], normalize_embeddings=True)
+            timings.append((time.perf_counter() - start) * 1000)
+        parity = parity_check(reference, model, queries, embeddings, top_k)
+        ok = parity["top_k_overlap"] >= index_cfg.parity_min_overlap
+        passed = passed and ok
+        print(
+            f"{backend:<10}{np.mean(timings):>10.2f}{parity['top_k_overlap']:>11.3f}"
+            f"{parity['top1_agreement']:>12.3f}{parity['min_cosine']:>9.4f}{'' if ok else '  DRIFT'}"
+        )
+    return passed
+
+
+def encode_report(rows: int | None, budgets: List[int]) -> None:
+    # Baseline: one model.encode call with batch_size=64 over the corpus, as build_index did before.
+    texts = [r["context_text"] for r in records_with_context(load_dataset(paths.data_path))][:rows]
+    model = load_encoder()
+    full = token_lengths(model, texts)
+    lengths = np.minimum(full, model.max_seq_length)
+    print(f"{len(texts)} texts, {int(lengths.sum())} tokens, max_seq_length={model.max_seq_length}, "
+          f"truncated={int(np.count_nonzero(full > model.max_seq_length))}")
+    model.encode(texts[:64], batch_size=64)  # warm-up
+    start = time.perf_counter()
+    reference = model.encode(texts, batch_size=64, convert_to_numpy=True, normalize_embeddings=True)
+    seconds = time.perf_counter() - start
+    print(f"{'batching':<18}{'texts/s':>9}{'tokens/s':>10}{'real tok':>10}{'max diff':>10}")
+    # model.encode already sorts by character length, so its fixed batches are approximately bucketed too.
+    by_chars = np.argsort([-len(t) for t in texts], kind="stable")
+    padded = sum(int(lengths[b].max()) * len(b) for b in np.array_split(by_chars, max(1, -(-len(texts) // 64))))
+    print(f"{'fixed 64':<18}{len(texts) / seconds:>9.1f}{lengths.sum() / seconds:>10.0f}{lengths.sum() / padded:>10.0%}{0.0:>10.1e}")
+    for budget in budgets:
+        stats = new_encode_stats()
+        vecs = encode_corpus(model, texts, stats, token_budget=budget)
+        real = stats["tokens"] / stats["padded_tokens"]
+        diff = float(np.abs(vecs - reference).max())
+        print(f"{f'bucketed {budget}':<18}{stats['texts'] / stats['seconds']:>9.1f}"
+              f"{stats['tokens'] / stats['seconds']:>10.0f}{real:>10.0%}{diff:>10.1e}")
+
+
+def parallel_report(rows: int | None, worker_counts: List[int], threads: int | None) -> None:
+    # Worker start-up (spawn + model load) is timed separately from encoding: a build pays it once.
+    texts = [r["context_text"] for r in records_with_context(load_dataset(paths.data_path))][:rows]
+    model = load_encoder()
+    start = time.perf_counter()
+    reference = encode_corpus(model, texts)
+    serial_s = time.perf_counter() - start
+    print(f"{len(texts)} texts on {os.cpu_count()} CPUs; serial in-process: {len(texts) / serial_s:.1f} texts/s")
+    print(f"{'workers':>8}{'threads':>9}{'start s':>9}{'texts/s':>9}{'speedup':>9}{'identical':>11}{'max diff':>10}")
+    for workers in worker_counts:
+        start = time.perf_counter()
+        with EncoderPool(workers, threads) as pool:
+            list(pool.imap([["warm up"]] * workers))  # returns once the workers have loaded their models
+            startup_s = time.perf_counter() - start
+            start = time.perf_counter()
+            vecs = encode_corpus(model, texts, pool=pool)
+            seconds = time.perf_counter() - start
+        print(
+            f"{workers:>8}{pool.threads:>9}{startup_s:>9.1f}{len(texts) / seconds:>9.1f}{serial_s / seconds:>8.2f}x"
+            f"{str(np.array_equal(vecs, reference)):>11}{float(np.abs(vecs - reference).max()):>10.1e}"
+        )
+
+
+def load_report(concurrency: List[int], requests_per_client: int, host: str, port: int) -> None:
+    # Suffix every query with a unique number so neither the exact-question table nor the query cache short-circuits it.
+    base = sample_queries(500)
+    counter = iter(range(10**9))
+    print(f"{'clients':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'mean batch':>12}")
+    for clients in concurrency:
+        before = RetrievalClient(host, port).stats()
+        latencies: List[float] = []
+        lock = threading.Lock()
+
+        def worker() -> None:
+            client = RetrievalClient(host, port)
+            local: List[float] = []
+            for _ in range(requests_per_client):
+                with lock:
+                    n = next(counter)
+                query = f"{base[n % len(base)]} {n}"
+                start = time.perf_counter()
+                client.search(query, top_k=3)
+                local.append((time.perf_counter() - start) * 1000)
+            client.close()
+            with lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=worker) for _ in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        after = RetrievalClient(host, port).stats()
+        batches = after["batches"] - before["batches"]
+        mean_batch = (after["queries"] - before["queries"]) / batches if batches else 0.0
+        print(
+            f"{clients:>8}{len(latencies) / elapsed:>10.1f}{np.percentile(latencies, 50):>10.2f}"
+            f"{np.percentile(latencies, 95):>10.2f}{mean_batch:>12.1f}"
+        )
+
+
+def rerank_report(num_queries: int, budget_ms: float) -> None:
+    from app.retriever import Retriever
+
+    df = load_dataset(paths.data_path)
+    pairs = expand_training_pairs(df)
+    random.Random(42).shuffle(pairs)
+    pairs = pairs[:num_queries]
+    index_cfg.exact_match = False  # measure the model, not the exact-question table
+    index_cfg.rerank = True
+    index_cfg.rerank_budget_ms = budget_ms
+    retriever = Retriever()
+    if retriever.reranker is None:
+        print(f"No cross-encoder found in {paths.cross_encoder_dir}; run `python -m app.train_reranker` first")
+        return
+    reranker = retriever.reranker
+    reranker.warm_up()
+    print(f"queries={len(pairs)} candidates={index_cfg.rerank_candidates} budget={budget_ms:.0f} ms")
+    print(f"{'stage':<12}{'top-1 acc':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, active in (("bi-encoder", None), ("re-ranked", reranker)):
+        retriever.reranker = active
+        retriever.query_cache.reset(retriever.query_cache.fingerprint)
+        correct = 0
+        timings: List[float] = []
+        for question, context in pairs:
+            start = time.perf_counter()
+            results = retriever.search(question, top_k=1)
+            timings.append((time.perf_counter() - start) * 1000)
+            correct += bool(results) and results[0][1].get("context_text") == context
+        print(f"{name:<12}{correct / len(pairs):>10.3f}{np.percentile(timings, 50):>10.2f}{np.percentile(timings, 95):>10.2f}")
+    stats = reranker.stats()
+    print(f"re-ranker: truncated={stats['truncated']} skipped={stats['skipped']} ms/pair={stats['ms_per_pair']:.3f}")
+
+
+def cascade_report(num_queries: int, margins: List[float], perturb: bool, top_k: int) -> None:
+    from app.retriever import Retriever
+
+    df = load_dataset(paths.data_path)
+    pairs = expand_training_pairs(df)
+    rng = random.Random(42)
+    rng.shuffle(pairs)
+    pairs = pairs[:num_queries]
+    if perturb:
+        # Drop one word so most queries miss the exact-question table, like real typed/spoken input.
+        perturbed = []
+        for question, context in pairs:
+            words = question.split()
+            if len(words) > 3:
+                del words[rng.randrange(len(words))]
+            perturbed.append((" ".join(words), context))
+        pairs = perturbed
+    index_cfg.cascade = True
+    retriever = Retriever()
+    stages = list(retriever.stage_exits)
+    print(
+        f"queries={len(pairs)} top_k={top_k} compact={retriever.index.compact is not None} "
+        f"reranker={retriever.reranker is not None}"
+    )
+    print(f"{'margin':>8}" + "".join(f"{s + ' %':>10}" for s in stages) + f"{'top-1 acc':>11}{'mean ms':>10}{'p95 ms':>10}")
+    for margin in margins:
+        index_cfg.cascade_margin = margin
+        retriever.stage_exits = {stage: 0 for stage in stages}
+        retriever.query_cache.reset(retriever.query_cache.fingerprint)
+        correct = 0
+        timings: List[float] = []
+        for question, context in pairs:
+            start = time.perf_counter()
+            results = retriever.search(question, top_k=top_k)
+            timings.append((time.perf_counter() - start) * 1000)
+            correct += bool(results) and results[0][1].get("context_text") == context
+        rates = "".join(f"{retriever.stage_exits[s] / len(pairs):>10.1%}" for s in stages)
+        print(f"{margin:>8.3f}{rates}{correct / len(pairs):>11.3f}{np.mean(timings):>10.2f}{np.percentile(timings, 95):>10.2f}")
+
+
+def partition_report(num_queries: int, top_partitions: int) -> None:
+    # Query embeddings are cached before timing, so the numbers are the scan + top-k + hit cost.
+    from app.retriever import Retriever
+
+    index_cfg.exact_match = False
+    index_cfg.query_cache_size = max(index_cfg.query_cache_size, num_queries)
+    retriever = Retriever()
+    if retriever.index.partitions is None:
+        raise SystemExit("No partitions.json in the index; rebuild it with python -m app.build_index")
+    df = load_dataset(paths.data_path)
+    categories = df["Category"].value_counts().index[:top_partitions]
+    print(f"{len(retriever.index.embeddings)} rows")
+    print(f"{'Category':<28}{'rows %':>8}{'runs':>6}{'full ms':>9}{'filtered ms':>13}{'full acc':>10}{'filtered acc':>14}")
+    for category in categories:
+        pairs = expand_training_pairs(df[df["Category"] == category])
+        random.Random(42).shuffle(pairs)
+        pairs = pairs[:num_queries]
+        filters = {"Category": str(category)}
+        runs = retriever.index.partitions.select(filters)
+        retriever.encode_queries([q for q, _ in pairs])
+        row: List[float] = []
+        for f in (None, filters):
+            timings: List[float] = []
+            correct = 0
+            for question, context in pairs:
+                start = time.perf_counter()
+                results = retriever.search(question, top_k=1, filters=f)
+                timings.append((time.perf_counter() - start) * 1000)
+                correct += bool(results) and results[0][1].get("context_text") == context
+            row += [float(np.mean(timings)), correct / len(pairs)]
+        share = int((runs[:, 1] - runs[:, 0]).sum()) / len(retriever.index.embeddings)
+        print(f"{str(category)[:27]:<28}{share:>8.1%}{len(runs):>6}{row[0]:>9.3f}{row[2]:>13.3f}{row[1]:>10.3f}{row[3]:>14.3f}")
+
+
+def _iterrows_training_pairs(df) -> List[tuple]:
+    # Row-by-row reference implementation the vectorised data_utils functions must reproduce exactly.
+    pairs = []
+    for _, row in df.iterrows():
+        context = build_context_text(row)
+        for q in str(row.get("questions") or "").splitlines():
+            question = q.strip().strip('"')
+            if question:
+                pairs.append((question, context))
+    return pairs
+
+
+def _iterrows_records(df) -> List[Dict]:
+    records = []
+    for _, row in df.iterrows():
+        record = row.to_dict()
+        record["context_text"] = build_context_text(row)
+        records.append(record)
+    return records
+
+
+def _digest(items: List) -> str:
+    # Hash item by item so the 100x comparison does not need two full JSON copies in memory.
+    h = hashlib.sha1()
+    for item in items:
+        h.update(json.dumps(item, ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()
+
+
+def prep_report(scales: List[int]) -> None:
+    import pandas as pd
+
+    base = load_dataset(paths.data_path)
+    print(f"{'rows':>9}{'step':>10}{'iterrows s':>12}{'vectorised s':>14}{'speedup':>9}{'identical':>11}")
+    for scale in scales:
+        df = pd.concat([base] * scale, ignore_index=True)
+        for name, legacy, fast in (
+            ("pairs", _iterrows_training_pairs, expand_training_pairs),
+            ("records", _iterrows_records, records_with_context),
+        ):
+            start = time.perf_counter()
+            expected = _digest(legacy(df))
+            legacy_s = time.perf_counter() - start
+            start = time.perf_counter()
+            actual = fast(df)
+            fast_s = time.perf_counter() - start
+            identical = expected == _digest(actual)
+            del actual
+            print(f"{len(df):>9}{name:>10}{legacy_s:>12.2f}{fast_s:>14.2f}{legacy_s / fast_s:>8.1f}x{str(identical):>11}")
+
+
+def _ingest_worker(data_path: str, index_dir: str, stream: bool, chunk_rows: int, results) -> None:
+    import resource
+    from app import build_index as builder
+
+    paths.data_path = data_path
+    paths.index_dir = paths.cache_dir = index_dir
+    start = time.perf_counter()
+    if stream:
+        builder.build_index_streaming(chunk_rows)
+    else:
+        builder.build_index()
+    results.put((time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def ingest_report(scales: List[int], chunk_rows: int, work_dir: str) -> None:
+    # Each build runs from an empty index directory in a fresh process, so ru_maxrss is that build's peak.
+    ctx = mp.get_context("spawn")
+    with open(paths.data_path, "rb") as f:
+        header = f.readline()
+        body = f.read()
+    if not body.endswith(b"\n"):
+        body += b"\n"
+    rows = []
+    for scale in scales:
+        data_path = os.path.join(work_dir, f"dataset_x{scale}.csv")
+        with open(data_path, "wb") as f:
+            f.write(header)
+            for _ in range(scale):
+                f.write(body)
+        for stream in (False, True):
+            index_dir = os.path.join(work_dir, f"index_x{scale}_{'stream' if stream else 'memory'}")
+            shutil.rmtree(index_dir, ignore_errors=True)
+            results = ctx.Queue()
+            proc = ctx.Process(target=_ingest_worker, args=(data_path, index_dir, stream, chunk_rows, results))
+            proc.start()
+            seconds, peak_mb = results.get()
+            proc.join()
+            shutil.rmtree(index_dir, ignore_errors=True)
+            rows.append((scale, "stream" if stream else "memory", seconds, peak_mb))
+        os.remove(data_path)
+    print(f"{'scale':>6}{'mode':>8}{'build s':>10}{'peak RSS MB':>13}")
+    for scale, mode, seconds, peak_mb in rows:
+        print(f"{scale:>6}{mode:>8}{seconds:>10.1f}{peak_mb:>13.0f}")
+
+
+def _corpora_worker(names: List[str], results) -> None:
+    from app.retriever import Retriever
+
+    retriever = Retriever(corpora=names)
+    retriever.search_corpora(["warm up"], names)
+    index_mb = sum(np.asarray(bundle.embeddings).nbytes for bundle in retriever.indexes.values()) / 1e6
+    results.put((_proc_memory_kb()["Rss"] / 1024, index_mb))
+
+
+def corpora_report(names: List[str]) -> None:
+    # One process per configuration, so each RSS includes its own model, torch runtime and indexes.
+    ctx = mp.get_context("spawn")
+    configs = [[name] for name in names] + ([names] if len(names) > 1 else [])
+    rows = []
+    for config in configs:
+        results = ctx.Queue()
+        proc = ctx.Process(target=_corpora_worker, args=(config, results))
+        proc.start()
+        rows.append((config, *results.get()))
+        proc.join()
+    print(f"{'corpora':<28}{'RSS MB':>10}{'embeddings MB':>15}")
+    for config, rss, index_mb in rows:
+        print(f"{'+'.join(config)[:27]:<28}{rss:>10.0f}{index_mb:>15.1f}")
+    if len(names) > 1:
+        separate = sum(rss for _, rss, _ in rows[:-1])
+        print(f"one process per corpus: {separate:.0f} MB, shared process: {rows[-1][1]:.0f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Retrieval performance reports")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ann = sub.add_parser("ann", help="Recall vs latency of the IVF index against exact search")
+    ann.add_argument("--queries", type=int, default=200)
+    ann.add_argument("--top-k", type=int, default=5)
+    ann.add_argument("--scale", type=int, default=1, help="Tile the corpus N times to simulate a larger index")
+    ann.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+
+    quant = sub.add_parser("quant", help="Memory, latency and recall of float16/int8 embeddings with rescoring")
+    quant.add_argument("--queries", type=int, default=200)
+    quant.add_argument("--top-k", type=int, default=5)
+    quant.add_argument("--scale", type=int, default=1)
+    quant.add_argument("--rescore", type=int, default=index_cfg.rescore_candidates)
+
+    dims = sub.add_parser("dims", help="Recall and latency of Matryoshka reduced-dimension search, with and without rescoring")
+    dims.add_argument("--queries", type=int, default=200)
+    dims.add_argument("--top-k", type=int, default=5)
+    dims.add_argument("--scale", type=int, default=1)
+    dims.add_argument("--dims", type=int, nargs="+", default=[32, 64, 128, 256])
+    dims.add_argument("--rescore", type=int, default=index_cfg.rescore_candidates)
+
+    dedup = sub.add_parser("dedup", help="Index shrinkage and join time of near-duplicate collapsing per threshold")
+    dedup.add_argument("--thresholds", type=float, nargs="+", default=[0.99, 0.98, 0.97, 0.95])
+    dedup.add_argument("--scale", type=int, default=1)
+
+    rss = sub.add_parser("rss", help="Per-worker open time and RSS/PSS with and without memory-mapped embeddings")
+    rss.add_argument("--workers", type=int, default=4)
+
+    meta = sub.add_parser("metadata", help="Startup time and heap usage of metadata.jsonl vs the columnar store")
+    meta.add_argument("--hits", type=int, default=3)
+
+    backend = sub.add_parser("backend", help="Encode latency and top-k parity of encoder backends against fp32")
+    backend.add_argument("--backends", nargs="+", default=list(ENCODER_BACKENDS), choices=ENCODER_BACKENDS)
+    backend.add_argument("--queries", type=int, default=200)
+    backend.add_argument("--top-k", type=int, default=5)
+    backend.add_argument("--threads", type=int, default=None)
+
+    encode = sub.add_parser("encode", help="Index encode throughput of fixed vs length-bucketed token-budget batches")
+    encode.add_argument("--rows", type=int, default=None, help="Encode only the first N rows")
+    encode.add_argument("--budgets", type=int, nargs="+", default=[4096, index_cfg.encode_token_budget, 65536])
+
+    parallel = sub.add_parser("parallel", help="Index encode scaling with 1..N worker processes")
+    parallel.add_argument("--rows", type=int, default=None, help="Encode only the first N rows")
+    parallel.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parallel.add_argument("--threads", type=int, default=None, help="torch threads per worker (default: CPUs / workers)")
+
+    load = sub.add_parser("load", help="Throughput of a running `python -m app.server` at several client counts")
+    load.add_argument("--clients", type=int, nargs="+", default=[1, 8, 64])
+    load.add_argument("--requests", type=int, default=50, help="Requests per client")
+    load.add_argument("--host", default=server_cfg.host)
+    load.add_argument("--port", type=int, default=server_cfg.port)
+
+    rerank = sub.add_parser("rerank", help="Added latency and top-1 accuracy gain of cross-encoder re-ranking")
+    rerank.add_argument("--queries", type=int, default=200)
+    rerank.add_argument("--budget-ms", type=float, default=index_cfg.rerank_budget_ms)
+
+    cascade = sub.add_parser("cascade", help="Per-stage exit rates, accuracy and latency of the retrieval cascade")
+    cascade.add_argument("--queries", type=int, default=200)
+    cascade.add_argument("--margins", type=float, nargs="+", default=[0.0, 0.01, 0.02, 0.05, 0.1])
+    cascade.add_argument("--no-perturb", action="store_true", help="Use dataset questions verbatim")
+    cascade.add_argument("--top-k", type=int, default=3, help="Hits per query (the chat and voice front-ends ask for 3)")
+
+    partition = sub.add_parser("partition", help="Latency and accuracy of Category-filtered vs full search")
+    partition.add_argument("--queries", type=int, default=100, help="Queries per category")
+    partition.add_argument("--categories", type=int, default=6, help="Largest N categories")
+
+    prep = sub.add_parser("prep", help="Vectorised vs iterrows dataset preparation on N-times copies of the CSV")
+    prep.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+
+    ingest = sub.add_parser("ingest", help="Build time and peak RSS of in-memory vs streaming index builds")
+    ingest.add_argument("--scales", type=int, nargs="+", default=[1, 10, 50], help="Copies of the CSV to index")
+    ingest.add_argument("--chunk-rows", type=int, default=index_cfg.stream_chunk_rows)
+    ingest.add_argument("--work-dir", default=os.path.join(os.getcwd(), "bench_ingest"))
+    corpora = sub.add_parser("corpora", help="RSS of one process serving several corpora vs one process per corpus")
+    corpora.add_argument("--corpus", nargs="+", default=list(paths.corpora), help="Named corpora from Paths.corpora")
+
+    args = parser.parse_args()
+    if args.command == "ann":
+        ann_report(args.queries, args.top_k, args.scale, args.nprobe)
+    elif args.command == "quant":
+        quant_report(args.queries, args.top_k, args.scale, args.rescore)
+    elif args.command == "dims":
+        dims_report(args.queries, args.top_k, args.scale, args.dims, args.rescore)
+    elif args.command == "dedup":
+        dedup_report(args.thresholds, args.scale)
+    elif args.command == "rss":
+        rss_report(args.workers)
+    elif args.command == "metadata":
+        metadata_report(args.hits)
+    elif args.command == "backend":
+        if not backend_report(args.backends, args.queries, args.top_k, args.threads):
+            sys.exit(1)
+    elif args.command == "encode":
+        encode_report(args.rows, args.budgets)
+    elif args.command == "parallel":
+        parallel_report(args.rows, args.workers, args.threads)
+    elif args.command == "load":
+        load_report(args.clients, args.requests, args.host, args.port)
+    elif args.command == "rerank":
+        rerank_report(args.queries, args.budget_ms)
+    elif args.command == "cascade":
+        cascade_report(args.queries, args.margins, not args.no_perturb, args.top_k)
+    elif args.command == "partition":
+        partition_report(args.queries, args.categories)
+    elif args.command == "prep":
+        prep_report(args.scales)
+    elif args.command == "ingest":
+        os.makedirs(args.work_dir, exist_ok=True)
+        ingest_report(args.scales, args.chunk_rows, args.work_dir)
+    elif args.command == "corpora":
+        corpora_report(args.corpus)
+
+
+if __name__ == "__main__":
+    main()
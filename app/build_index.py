@@ -2,38 +2,474 @@ from __future__ import annotations
 
 import os
 import json
-from typing import List, Dict
+import time
+import argparse
+import contextlib
+from typing import List, Dict, Tuple, TYPE_CHECKING
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
+import pandas as pd
 
-from app.config import paths, ensure_directories
-from app.data_utils import load_dataset, records_with_context
+from app.ann import IVFIndex
+from app.bundles import DEFAULT_CORPUS, MANIFEST_NAME, corpus_root, read_manifest, resolve_index_dir, staged_version, write_manifest
+from app.config import paths, index_cfg, ensure_directories
+from app.dataset_cache import file_sha1
+from app.data_utils import load_dataset, records_with_context, question_lookup, scan_dataset
+from app.dedup import collapse_records, near_duplicate_clusters, split_clusters
+from app.encoder import EncoderPool, encode_corpus, encoder_fingerprint, format_encode_stats, load_encoder, new_encode_stats
+from app.fingerprints import text_hash
+from app.lexical import LexicalIndex
+from app.metadata_store import STORE_NAME, MetadataStore, MetadataWriter, write_metadata
+from app.partitions import PARTITIONS_NAME, PartitionBuilder
+from app.quantize import EMBEDDING_DTYPES, QuantizedEmbeddings, create_matrix, load_matrix, publish_matrix, save_matrix, write_reduced
 
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
 
-def build_index() -> str:
+
+IVF_NAME = "ivf.npz"
+QUESTIONS_NAME = "questions.json"
+LEXICAL_NAME = "lexical.npz"
+HASHES_NAME = "row_hashes.npy"
+# Per-row vectors aligned with row_hashes.npy when embeddings.npy holds collapsed near-duplicates.
+SOURCE_NAME = "source_embeddings.npy"
+HASH_DTYPE = "S40"  # hex sha1 of each row's context text
+WATCH_METRICS_NAME = "watch_metrics.jsonl"
+
+
+def load_previous_index(index_dir: str, fingerprint: str) -> Tuple[np.ndarray, np.ndarray | None]:
+    # Previous embeddings are memory-mapped: only the reused rows are ever read.
+    vec_path = os.path.join(index_dir, SOURCE_NAME)
+    if not os.path.exists(vec_path):
+        vec_path = os.path.join(index_dir, "embeddings.npy")
+    manifest_path = os.path.join(index_dir, MANIFEST_NAME)
+    empty = np.empty(0, dtype=HASH_DTYPE)
+    if not (os.path.exists(vec_path) and os.path.exists(manifest_path)):
+        return empty, None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("model_fingerprint") != fingerprint:
+        print("Model, encoder backend or max_seq_length changed since last build, re-encoding all rows")
+        return empty, None
+    rows = manifest.get("rows", [])
+    if isinstance(rows, list):
+        # Manifests written before row_hashes.npy existed list every row inline.
+        hashes = np.array([row["hash"] for row in rows], dtype=HASH_DTYPE)
+    else:
+        hashes = load_matrix(os.path.join(index_dir, HASHES_NAME), mmap=True)
+    embeddings = load_matrix(vec_path, mmap=True)
+    if len(hashes) != len(embeddings):
+        return empty, None
+    return hashes, embeddings
+
+
+class PreviousRows:
+    # Maps content hashes to their first row in the previous build via a sorted hash array
+    # (binary search), so a chunk can be matched without a per-row dict of the whole corpus.
+    def __init__(self, hashes: np.ndarray) -> None:
+        self.hashes = hashes
+        self.order = np.argsort(hashes, kind="stable")
+        self.sorted = hashes[self.order]
+
+    def find(self, hashes: np.ndarray) -> np.ndarray:
+        if not len(self.sorted):
+            return np.full(len(hashes), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.sorted, hashes), len(self.sorted) - 1)
+        return np.where(self.sorted[pos] == hashes, self.order[pos], -1).astype(np.int64)
+
+    def dropped(self, current: np.ndarray) -> int:
+        if not len(self.sorted):
+            return 0
+        return int(np.count_nonzero(~np.isin(self.hashes, current)))
+
+
+def write_ann_index(embeddings: np.ndarray, index_dir: str) -> None:
+    if index_cfg.ann_type not in {"exact", "ivf"}:
+        raise ValueError(f"Unknown ann_type: {index_cfg.ann_type}")
+    ivf_path = os.path.join(index_dir, IVF_NAME)
+    if index_cfg.ann_type == "exact":
+        if os.path.exists(ivf_path):
+            os.remove(ivf_path)
+        return
+    ivf = IVFIndex.build(embeddings, nlist=index_cfg.ivf_nlist)
+    ivf.save(ivf_path)
+    print(f"IVF index: {ivf.nlist} lists over {len(embeddings)} rows")
+
+
+def write_quantized(embeddings: np.ndarray, index_dir: str) -> None:
+    if index_cfg.embedding_dtype not in EMBEDDING_DTYPES:
+        raise ValueError(f"Unknown embedding_dtype: {index_cfg.embedding_dtype}")
+    for dtype in EMBEDDING_DTYPES[1:]:
+        for path in QuantizedEmbeddings.paths(index_dir, dtype):
+            if dtype != index_cfg.embedding_dtype and os.path.exists(path):
+                os.remove(path)
+    if index_cfg.embedding_dtype == "float32":
+        return
+    compact = QuantizedEmbeddings.write_blockwise(embeddings, index_cfg.embedding_dtype, index_dir)
+    print(f"{compact.dtype} embeddings: {compact.nbytes / 1e6:.1f} MB (float32: {embeddings.nbytes / 1e6:.1f} MB)")
+
+
+def write_reduced_embeddings(embeddings: np.ndarray, index_dir: str) -> None:
+    dim = index_cfg.search_dim
+    for name in os.listdir(index_dir):
+        if name.startswith("embeddings.d") and name.endswith(".npy") and name != f"embeddings.d{dim}.npy":
+            os.remove(os.path.join(index_dir, name))
+    if not dim:
+        return
+    if dim >= embeddings.shape[1]:
+        raise ValueError(f"search_dim={dim} must be smaller than the embedding size {embeddings.shape[1]}")
+    write_reduced(embeddings, dim, index_dir)
+    print(f"Reduced embeddings: {dim} of {embeddings.shape[1]} dims")
+
+
+def _dataset_identity() -> Dict:
+    st = os.stat(paths.data_path)
+    return {
+        "dataset": os.path.abspath(paths.data_path),
+        "dataset_sha1": file_sha1(paths.data_path),
+        "dataset_mtime": st.st_mtime_ns / 1e9,
+    }
+
+
+def _write_manifest(
+    index_dir: str, fingerprint: str, rows: int, embeddings: np.ndarray, dataset: Dict, build: Dict[str, int]
+) -> None:
+    # "rows" counts source rows (aligned with row_hashes.npy); "indexed_rows" the rows in embeddings.npy.
+    write_manifest(index_dir, {
+        "model_fingerprint": fingerprint,
+        "rows": rows,
+        "row_hashes": HASHES_NAME,
+        "indexed_rows": int(embeddings.shape[0]),
+        "dim": int(embeddings.shape[1]),
+        **dataset,
+        "build": build,
+    })
+
+
+def _write_questions(lookup: Dict[str, List[int]], index_dir: str) -> None:
+    with open(os.path.join(index_dir, QUESTIONS_NAME), "w", encoding="utf-8") as f:
+        json.dump(lookup, f, ensure_ascii=False)
+    print(f"Exact-question lookup: {len(lookup)} normalised questions")
+
+
+def _write_partitions(partitions: PartitionBuilder, index_dir: str) -> None:
+    partitions.save(os.path.join(index_dir, PARTITIONS_NAME))
+    print(f"Partitions: {partitions.summary()}")
+
+
+def _write_lexical(records, index_dir: str) -> None:
+    lexical = LexicalIndex.build(records)
+    lexical.save(os.path.join(index_dir, LEXICAL_NAME))
+    print(f"Lexical index: {len(lexical.vocab)} terms, {len(lexical.entity_names)} entity names")
+
+
+def _encoder_pool():
+    if index_cfg.encode_workers > 1:
+        return EncoderPool(index_cfg.encode_workers, index_cfg.encode_worker_threads)
+    return contextlib.nullcontext()
+
+
+def build_index(model: SentenceTransformer | None = None) -> str:
     ensure_directories()
 
-    model = SentenceTransformer(paths.model_dir)
+    dataset = _dataset_identity()
     df = load_dataset(paths.data_path)
     records: List[Dict] = records_with_context(df)
 
     texts = [r["context_text"] for r in records]
-    embeddings = model.encode(texts, batch_size=64, convert_to_numpy=True, show_progress_bar=True, normalize_embeddings=True)
+    hashes = np.array([text_hash(t) for t in texts], dtype=HASH_DTYPE)
+    fingerprint = encoder_fingerprint()
+    old_hashes, old_embeddings = load_previous_index(resolve_index_dir(), fingerprint)
+    previous = PreviousRows(old_hashes)
+    src = previous.find(hashes)
+    reuse_dst = np.flatnonzero(src >= 0)
+    encode_dst = np.flatnonzero(src < 0)
 
-    os.makedirs(paths.index_dir, exist_ok=True)
-    vec_path = os.path.join(paths.index_dir, "embeddings.npy")
-    meta_path = os.path.join(paths.index_dir, "metadata.jsonl")
+    new_embeddings = None
+    encode_stats = new_encode_stats()
+    if len(encode_dst):
+        model = model or load_encoder()
+        with _encoder_pool() as pool:
+            new_embeddings = encode_corpus(model, [texts[i] for i in encode_dst], encode_stats, show_progress_bar=True, pool=pool)
+    dim = new_embeddings.shape[1] if new_embeddings is not None else old_embeddings.shape[1]
+    dtype = new_embeddings.dtype if new_embeddings is not None else old_embeddings.dtype
+    embeddings = np.empty((len(texts), dim), dtype=dtype)
+    if len(reuse_dst):
+        embeddings[reuse_dst] = old_embeddings[src[reuse_dst]]
+    if len(encode_dst):
+        embeddings[encode_dst] = new_embeddings
+    dropped = previous.dropped(hashes)
+    del previous, old_hashes, old_embeddings
+    source_embeddings = embeddings
+    total = len(records)
+    if index_cfg.dedup_threshold:
+        canonical = split_clusters(records, near_duplicate_clusters(embeddings, index_cfg.dedup_threshold))
+        keep, records = collapse_records(records, canonical)
+        embeddings = embeddings[keep]
+        largest = int(np.bincount(canonical).max())
+        print(
+            f"Near-duplicates (cosine >= {index_cfg.dedup_threshold}): {total} rows -> {len(keep)} canonical, "
+            f"{1 - len(keep) / total:.1%} smaller, largest cluster {largest} rows"
+        )
 
-    np.save(vec_path, embeddings)
-    with open(meta_path, "w", encoding="utf-8") as f:
-        for r in records:
-            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    with staged_version() as index_dir:
+        save_matrix(os.path.join(index_dir, "embeddings.npy"), embeddings)
+        if embeddings is not source_embeddings:
+            save_matrix(os.path.join(index_dir, SOURCE_NAME), source_embeddings)
+        save_matrix(os.path.join(index_dir, HASHES_NAME), hashes)
+        if index_cfg.metadata_jsonl:
+            with open(os.path.join(index_dir, "metadata.jsonl"), "w", encoding="utf-8") as f:
+                for r in records:
+                    f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        write_metadata(os.path.join(index_dir, STORE_NAME), records)
+        write_ann_index(embeddings, index_dir)
+        write_quantized(embeddings, index_dir)
+        write_reduced_embeddings(embeddings, index_dir)
+        print(f"Rows reused: {len(reuse_dst)}, re-encoded: {len(encode_dst)}, dropped: {dropped}")
+        if encode_stats["texts"]:
+            print(format_encode_stats(encode_stats, model.max_seq_length))
+        _write_questions(question_lookup(records), index_dir)
+        partitions = PartitionBuilder()
+        partitions.add(records)
+        _write_partitions(partitions, index_dir)
+        _write_lexical(records, index_dir)
+        build = {"reused": len(reuse_dst), "encoded": len(encode_dst), "dropped": dropped}
+        _write_manifest(index_dir, fingerprint, total, embeddings, dataset, build)
+    return index_dir
 
-    return paths.index_dir
 
+def build_index_streaming(chunk_rows: int | None = None, model: SentenceTransformer | None = None) -> str:
+    # Two passes over the CSV: the first counts rows so embeddings can go straight into a preallocated
+    # memory-mapped matrix; the second prepares, encodes and writes one chunk at a time. Only the
+    # row hashes and the question table grow with the corpus.
+    ensure_directories()
+    chunk_rows = chunk_rows or index_cfg.stream_chunk_rows
+
+    if index_cfg.dedup_threshold:
+        print("dedup_threshold is not applied by the streaming build; every row is indexed")
+    dataset = _dataset_identity()
+    encoding, total, dtypes = scan_dataset(paths.data_path, chunk_rows)
+    if not total:
+        raise ValueError(f"No rows in {paths.data_path}")
+    print(f"Streaming {total} rows ({encoding}) in chunks of {chunk_rows}")
+    fingerprint = encoder_fingerprint()
+    old_hashes, old_embeddings = load_previous_index(resolve_index_dir(), fingerprint)
+    previous = PreviousRows(old_hashes)
+    if old_embeddings is not None:
+        dim, dtype = old_embeddings.shape[1], old_embeddings.dtype
+    else:
+        model = model or load_encoder()
+        dim, dtype = getattr(model, "get_embedding_dimension", model.get_sentence_embedding_dimension)(), np.float32
+
+    with staged_version() as index_dir:
+        vec_path = os.path.join(index_dir, "embeddings.npy")
+        hashes_path = os.path.join(index_dir, HASHES_NAME)
+        meta_path = os.path.join(index_dir, "metadata.jsonl")
+
+        embeddings = create_matrix(vec_path, (total, dim), dtype)
+        hashes = create_matrix(hashes_path, (total,), HASH_DTYPE)
+        writer: MetadataWriter | None = None
+        lookup: Dict[str, List[int]] = {}
+        partitions = PartitionBuilder()
+        reused = encoded = start = 0
+        encode_stats = new_encode_stats()
+        pool: EncoderPool | None = None
+        pool_started = False
+        with contextlib.ExitStack() as stack:
+            meta_file = stack.enter_context(open(meta_path + ".tmp", "w", encoding="utf-8")) if index_cfg.metadata_jsonl else None
+            for chunk in pd.read_csv(paths.data_path, encoding=encoding, chunksize=chunk_rows):
+                records = records_with_context(chunk.astype(dtypes))
+                if start + len(records) > total:
+                    raise RuntimeError(f"{paths.data_path} grew while it was being indexed")
+                stop = start + len(records)
+                texts = [r["context_text"] for r in records]
+                chunk_hashes = np.array([text_hash(t) for t in texts], dtype=HASH_DTYPE)
+                src = previous.find(chunk_hashes)
+                reuse = np.flatnonzero(src >= 0)
+                missing = np.flatnonzero(src < 0)
+                if len(reuse):
+                    embeddings[start + reuse] = old_embeddings[src[reuse]]
+                if len(missing):
+                    if model is None:
+                        model = load_encoder()
+                    if not pool_started:
+                        # Started on first use, so a rebuild that reuses every row never spawns workers.
+                        pool = stack.enter_context(_encoder_pool())
+                        pool_started = True
+                    embeddings[start + missing] = encode_corpus(model, [texts[i] for i in missing], encode_stats, pool=pool)
+                hashes[start:stop] = chunk_hashes
+                if writer is None:
+                    writer = MetadataWriter(os.path.join(index_dir, STORE_NAME), list(records[0].keys()) if records else [])
+                writer.append(records)
+                if meta_file is not None:
+                    for r in records:
+                        meta_file.write(json.dumps(r, ensure_ascii=False) + "\n")
+                question_lookup(records, lookup, start)
+                partitions.add(records, start)
+                reused += len(reuse)
+                encoded += len(missing)
+                start = stop
+                print(f"  {stop}/{total} rows (reused {reused}, encoded {encoded})")
+        if start != total:
+            raise RuntimeError(f"{paths.data_path} changed while it was being indexed ({start} rows read, {total} counted)")
+
+        dropped = previous.dropped(hashes)
+        del previous, old_hashes, old_embeddings
+        publish_matrix(vec_path, embeddings)
+        publish_matrix(hashes_path, hashes)
+        if index_cfg.metadata_jsonl:
+            os.replace(meta_path + ".tmp", meta_path)
+        if writer is None:
+            writer = MetadataWriter(os.path.join(index_dir, STORE_NAME), [])
+        writer.close()
+        embeddings = load_matrix(vec_path, mmap=True)
+        write_ann_index(embeddings, index_dir)
+        write_quantized(embeddings, index_dir)
+        write_reduced_embeddings(embeddings, index_dir)
+        print(f"Rows reused: {reused}, re-encoded: {encoded}, dropped: {dropped}")
+        if encode_stats["texts"]:
+            print(format_encode_stats(encode_stats, model.max_seq_length))
+        _write_questions(lookup, index_dir)
+        _write_partitions(partitions, index_dir)
+        # BM25 postings grow with the corpus, so a streaming build only writes them when hybrid search uses them.
+        if index_cfg.hybrid:
+            _write_lexical(MetadataStore(os.path.join(index_dir, STORE_NAME)), index_dir)
+        build = {"reused": reused, "encoded": encoded, "dropped": dropped}
+        _write_manifest(index_dir, fingerprint, total, embeddings, dataset, build)
+    return index_dir
 
-if __name__ == "__main__":
-    out = build_index()
-    print(f"Index built at: {out}")
 
+def _dataset_stat() -> Tuple[int, int] | None:
+    try:
+        st = os.stat(paths.data_path)
+    except FileNotFoundError:  # editors that save via delete + rename leave a short gap
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def watch_dataset(
+    stream: bool = False, chunk_rows: int | None = None, interval_s: float | None = None, debounce_s: float | None = None
+) -> None:
+    # Polls the CSV's size/mtime and rebuilds once it has been stable for debounce_s, so a burst of
+    # saves costs one build. The content hash is compared with the published manifest first, so a
+    # touch or a save without edits does not rebuild. Rebuilds reuse every unchanged row's embedding
+    # and keep the encoder loaded between builds; each one is published for watching retrievers.
+    ensure_directories()
+    interval_s = interval_s or index_cfg.watch_interval_s
+    debounce_s = index_cfg.watch_debounce_s if debounce_s is None else debounce_s
+    metrics_path = os.path.join(paths.index_dir, WATCH_METRICS_NAME)
+    # Loaded up front so the first save does not wait for torch; reloaded if the model is retrained.
+    model, model_fingerprint = load_encoder(), encoder_fingerprint()
+    latencies: List[float] = []
+    seen: Tuple[int, int] | None = None
+    handled: Tuple[int, int] | None = None
+    changed_at = 0.0
+    print(f"Watching {paths.data_path} every {interval_s}s (debounce {debounce_s}s); Ctrl+C to stop")
+    try:
+        while True:
+            stat = _dataset_stat()
+            now = time.time()
+            if stat != seen:
+                seen, changed_at = stat, now
+            if stat is None or stat == handled or now - changed_at < debounce_s:
+                time.sleep(interval_s)
+                continue
+            handled = stat
+            started = time.time()
+            saved_at = stat[1] / 1e9
+            record: Dict = {"saved_at": saved_at, "detect_s": changed_at - saved_at, "debounce_s": started - changed_at}
+            try:
+                # The file can vanish again between the stat and the reads below (delete + rename saves).
+                dataset_sha1 = file_sha1(paths.data_path)
+                if dataset_sha1 == (read_manifest(resolve_index_dir()) or {}).get("dataset_sha1"):
+                    print(f"Dataset content unchanged (sha1 {dataset_sha1[:12]}); index is current")
+                    continue
+                if encoder_fingerprint() != model_fingerprint:
+                    model, model_fingerprint = load_encoder(), encoder_fingerprint()
+                index_dir = build_index_streaming(chunk_rows, model) if stream else build_index(model)
+            except Exception as exc:
+                # Often a half-written or malformed CSV; the next save triggers another attempt. A file that
+                # could not be read at all is retried once it has been stable for debounce_s again.
+                record["error"] = f"{type(exc).__name__}: {exc}"
+                print(f"Rebuild failed, still serving the previous version: {record['error']}")
+                if isinstance(exc, OSError):
+                    handled = seen = None
+            else:
+                published = time.time()
+                manifest = read_manifest(index_dir) or {}
+                record.update({
+                    "version": manifest.get("version"),
+                    "build_s": published - started,
+                    "save_to_servable_s": published - saved_at,
+                    **manifest.get("build", {}),
+                })
+                latencies.append(record["save_to_servable_s"])
+                print(
+                    f"Published {record['version']}: {record.get('encoded', 0)} rows re-encoded, build {record['build_s']:.1f}s, "
+                    f"save to servable {record['save_to_servable_s']:.1f}s (+ up to {index_cfg.reload_interval_s}s "
+                    "until watching retrievers swap)"
+                )
+            with open(metrics_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+    except KeyboardInterrupt:
+        pass
+    if latencies:
+        print(
+            f"{len(latencies)} rebuilds, save to servable p50 {np.percentile(latencies, 50):.1f}s "
+            f"p95 {np.percentile(latencies, 95):.1f}s max {max(latencies):.1f}s (details in {metrics_path})"
+        )
+
+
+def use_corpus(name: str) -> None:
+    # Points paths.data_path / paths.index_dir at a named corpus, so the build functions index it.
+    root = corpus_root(name)
+    if name != DEFAULT_CORPUS:
+        paths.data_path = paths.corpora[name]
+    paths.index_dir = root
+
+
+def build_corpora(names: List[str], stream: bool = False, chunk_rows: int | None = None) -> Dict[str, str]:
+    # Builds several corpora in one process with one loaded encoder.
+    data_path, index_dir = paths.data_path, paths.index_dir
+    model = load_encoder()
+    built: Dict[str, str] = {}
+    try:
+        for name in names:
+            paths.data_path, paths.index_dir = data_path, index_dir
+            use_corpus(name)
+            print(f"Corpus {name}: {paths.data_path}")
+            built[name] = build_index_streaming(chunk_rows, model) if stream else build_index(model)
+    finally:
+        paths.data_path, paths.index_dir = data_path, index_dir
+    return built
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the retrieval index from paths.data_path")
+    parser.add_argument("--stream", action="store_true", default=index_cfg.stream_build,
+                        help="read, encode and write the CSV in chunks to bound peak memory")
+    parser.add_argument("--chunk-rows", type=int, default=index_cfg.stream_chunk_rows)
+    parser.add_argument("--workers", type=int, default=index_cfg.encode_workers,
+                        help="encode in N processes, each with its own model copy")
+    parser.add_argument("--worker-threads", type=int, default=index_cfg.encode_worker_threads)
+    parser.add_argument("--watch", action="store_true", help="keep running and rebuild whenever the CSV changes")
+    parser.add_argument("--interval", type=float, default=index_cfg.watch_interval_s, help="--watch polling interval (s)")
+    parser.add_argument("--debounce", type=float, default=index_cfg.watch_debounce_s,
+                        help="--watch waits until the CSV has been unchanged this long (s)")
+    parser.add_argument("--corpus", action="append", metavar="NAME",
+                        help="index a named corpus from Paths.corpora instead of paths.data_path (repeatable)")
+    args = parser.parse_args()
+    index_cfg.encode_workers = args.workers
+    index_cfg.encode_worker_threads = args.worker_threads
+    if args.watch:
+        if args.corpus and len(args.corpus) > 1:
+            parser.error("--watch follows one corpus per process")
+        if args.corpus:
+            use_corpus(args.corpus[0])
+        watch_dataset(args.stream, args.chunk_rows, args.interval, args.debounce)
+    elif args.corpus:
+        for name, out in build_corpora(args.corpus, args.stream, args.chunk_rows).items():
+            print(f"Index for {name} built at: {out}")
+    else:
+        out = build_index_streaming(args.chunk_rows) if args.stream else build_index()
+        print(f"Index built at: {out}")
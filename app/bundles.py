@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import os
+import json
+import time
+import shutil
+import argparse
+import datetime
+import contextlib
+from typing import List, Dict
+
+from app.config import paths, index_cfg
+from app.dataset_cache import file_sha1
+
+
+# Each build is written to <index_dir>/versions/<version>/ and becomes current when CURRENT (one line:
+# the version name) is replaced atomically. Readers resolve the pointer once and then only open files
+# inside that version, so they never see a half-written or mixed index.
+POINTER_NAME = "CURRENT"
+VERSIONS_DIR = "versions"
+MANIFEST_NAME = "manifest.json"
+CORPORA_DIR = "corpora"
+DEFAULT_CORPUS = "default"
+
+
+def corpus_root(name: str) -> str:
+    # The default corpus (paths.data_path) is indexed in index_dir itself; each named corpus in
+    # paths.corpora has its own root, with its own CURRENT pointer and versions.
+    if name == DEFAULT_CORPUS:
+        return paths.index_dir
+    if name not in paths.corpora:
+        raise ValueError(f"Unknown corpus: {name} (configured: {', '.join(sorted(paths.corpora)) or 'none'})")
+    return os.path.join(paths.index_dir, CORPORA_DIR, name)
+
+
+def current_version(root: str | None = None) -> str | None:
+    try:
+        with open(os.path.join(root or paths.index_dir, POINTER_NAME), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def version_dir(version: str, root: str | None = None) -> str:
+    return os.path.join(root or paths.index_dir, VERSIONS_DIR, version)
+
+
+def resolve_index_dir(root: str | None = None) -> str:
+    # Indexes built before versioning live directly in index_dir and have no pointer.
+    version = current_version(root)
+    return version_dir(version, root) if version else (root or paths.index_dir)
+
+
+def list_versions(root: str | None = None) -> List[str]:
+    versions = os.path.join(root or paths.index_dir, VERSIONS_DIR)
+    if not os.path.isdir(versions):
+        return []
+    return sorted(name for name in os.listdir(versions) if os.path.isdir(os.path.join(versions, name)))
+
+
+def new_version_dir(root: str | None = None) -> str:
+    # Names sort by creation time, which is the order prune_versions relies on.
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    path = version_dir(f"{stamp}-{os.getpid()}", root)
+    os.makedirs(path)
+    return path
+
+
+def bundle_files(index_dir: str) -> Dict[str, Dict]:
+    files: Dict[str, Dict] = {}
+    for base, dirs, names in os.walk(index_dir):
+        dirs.sort()
+        for name in sorted(names):
+            full = os.path.join(base, name)
+            rel = os.path.relpath(full, index_dir).replace(os.sep, "/")
+            if rel != MANIFEST_NAME:
+                files[rel] = {"size": os.path.getsize(full), "sha1": file_sha1(full)}
+    return files
+
+
+def write_manifest(index_dir: str, manifest: Dict) -> Dict:
+    # Written last: a version directory without a manifest is an unfinished build.
+    manifest = {
+        "version": os.path.basename(os.path.normpath(index_dir)),
+        "created": time.time(),
+        **manifest,
+        "files": bundle_files(index_dir),
+    }
+    path = os.path.join(index_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + ".tmp", path)
+    return manifest
+
+
+def read_manifest(index_dir: str) -> Dict | None:
+    try:
+        with open(os.path.join(index_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def verify_bundle(index_dir: str, checksums: bool = True) -> List[str]:
+    # Returns the problems found; an empty list means the bundle matches its manifest.
+    manifest = read_manifest(index_dir)
+    if manifest is None:
+        return [f"{index_dir}: no manifest"]
+    if "files" not in manifest:
+        return [f"{index_dir}: manifest has no file list (built before versioned bundles)"]
+    problems = []
+    for rel, expected in manifest["files"].items():
+        full = os.path.join(index_dir, rel)
+        if not os.path.exists(full):
+            problems.append(f"{rel}: missing")
+        elif os.path.getsize(full) != expected["size"]:
+            problems.append(f"{rel}: size {os.path.getsize(full)} != {expected['size']}")
+        elif checksums and file_sha1(full) != expected["sha1"]:
+            problems.append(f"{rel}: checksum mismatch")
+    return problems
+
+
+def publish(index_dir: str, root: str | None = None) -> str:
+    root = root or paths.index_dir
+    version = os.path.basename(os.path.normpath(index_dir))
+    if read_manifest(index_dir) is None:
+        raise ValueError(f"{index_dir} has no manifest; refusing to publish an unfinished build")
+    pointer = os.path.join(root, POINTER_NAME)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer + ".tmp", pointer)
+    prune_versions(root)
+    return version
+
+
+@contextlib.contextmanager
+def staged_version(root: str | None = None):
+    # Yields a fresh version directory to build into; it is published if the block completes and
+    # removed if it raises, so a failed build never becomes visible.
+    index_dir = new_version_dir(root)
+    try:
+        yield index_dir
+    except BaseException:
+        shutil.rmtree(index_dir, ignore_errors=True)
+        raise
+    publish(index_dir, root)
+
+
+def prune_versions(root: str | None = None, keep: int | None = None) -> List[str]:
+    # Keeps the current version plus the `keep` versions before it (for rollback). Newer directories
+    # are left alone: they may belong to a build that is still running. Retrievers that still map a
+    # removed version keep working on Linux/macOS; the files disappear once they swap.
+    keep = index_cfg.keep_versions if keep is None else keep
+    current = current_version(root)
+    versions = list_versions(root)
+    if current not in versions:
+        return []
+    older = versions[:versions.index(current)]
+    removed = older[:max(0, len(older) - keep)]
+    for version in removed:
+        shutil.rmtree(version_dir(version, root), ignore_errors=True)
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List, verify or roll back the versioned index bundles")
+    parser.add_argument("--verify", action="store_true", help="check every file of the current version against its manifest")
+    parser.add_argument("--publish", metavar="VERSION", help="point CURRENT at an existing version (rollback)")
+    args = parser.parse_args()
+    if args.publish:
+        print(f"Current version: {publish(version_dir(args.publish))}")
+    current = current_version()
+    for version in list_versions():
+        manifest = read_manifest(version_dir(version)) or {}
+        marker = "*" if version == current else " "
+        print(f"{marker} {version}  rows={manifest.get('indexed_rows', '?')} dim={manifest.get('dim', '?')} "
+              f"dataset={str(manifest.get('dataset_sha1', '?'))[:12]}")
+    if args.verify:
+        problems = verify_bundle(resolve_index_dir())
+        for problem in problems:
+            print(problem)
+        print("OK" if not problems else f"{len(problems)} problem(s)")
+        raise SystemExit(1 if problems else 0)
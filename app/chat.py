@@ -1,12 +1,17 @@
 from __future__ import annotations
 
+from app.startup import profile
+
 import sys
-from typing import Optional
+import argparse
+from typing import List, Optional, Tuple, TYPE_CHECKING
 
 from rich.console import Console
 from rich.panel import Panel
 
-from app.retriever import Retriever
+if TYPE_CHECKING:
+    from app.client import RetrievalClient
+    from app.retriever import Retriever
 
 
 def format_answer(hit: dict) -> str:
@@ -29,9 +34,68 @@ def format_answer(hit: dict) -> str:
     return "\n".join(parts)
 
 
-def chat_loop() -> None:
+def print_stats(retriever: Retriever | RetrievalClient, console: Console) -> None:
+    stats = retriever.stats()
+    console.print(
+        f"Exact-question hits: {stats['exact_hits']}/"
+        f"{stats['exact_hits'] + stats.get('exact_encoded', 0) + stats['exact_misses']} "
+        f"({stats['exact_hit_rate']:.0%}), query cache hits: {stats['query_cache_hits']}",
+        style="dim",
+    )
+
+
+def best_matches(
+    retriever: Retriever | RetrievalClient, queries: List[str], corpora: List[str] | None = None
+) -> List[Tuple[str | None, float, dict] | None]:
+    # With several corpora each query is encoded once, scored against all of them, and the best hit wins.
+    if not corpora or len(corpora) == 1:
+        batch = retriever.search_batch(queries, top_k=3, corpus=corpora[0] if corpora else None)
+        return [(None, *results[0]) if results else None for results in batch]
+    matches = []
+    for per_corpus in retriever.search_corpora(queries, corpora, top_k=3):
+        found = [(name, *hits[0]) for name, hits in per_corpus.items() if hits]
+        matches.append(max(found, key=lambda match: match[1]) if found else None)
+    return matches
+
+
+def show_match(match: Tuple[str | None, float, dict] | None, console: Console) -> None:
+    if match is None:
+        console.print(Panel("I could not find an answer.", title="No Match"))
+        return
+    corpus, score, hit = match
+    title = f"Match score: {score:.3f}" + (f" ({corpus})" if corpus else "")
+    console.print(Panel(format_answer(hit), title=title))
+
+
+def answer_piped(retriever: Retriever | RetrievalClient, console: Console, corpora: List[str] | None = None) -> None:
+    # Scripted/piped input: read every query up front and answer them with one batched search.
+    queries = []
+    for line in sys.stdin:
+        query = line.strip()
+        if not query:
+            continue
+        if query.lower() in {"exit", "quit", "q"}:
+            break
+        queries.append(query)
+    for query, match in zip(queries, best_matches(retriever, queries, corpora)):
+        console.print(f"\n[bold cyan]You:[/bold cyan] {query}")
+        show_match(match, console)
+
+
+def chat_loop(use_server: bool = False, watch: bool = False, corpora: List[str] | None = None) -> None:
     console = Console()
-    retriever = Retriever()
+    if use_server:
+        from app.client import RetrievalClient
+        retriever = RetrievalClient()
+    else:
+        with profile.phase("import retriever"):
+            from app.retriever import Retriever
+        retriever = Retriever(watch=watch, corpora=corpora)
+    profile.report()
+    if not sys.stdin.isatty():
+        answer_piped(retriever, console, corpora)
+        print_stats(retriever, console)
+        return
     console.print(Panel("College Placement QA Chatbot - type 'exit' to quit", title="Ready"))
     while True:
         console.print("\n[bold cyan]You:[/bold cyan] ", end="")
@@ -43,14 +107,18 @@ def chat_loop() -> None:
             continue
         if query.lower() in {"exit", "quit", "q"}:
             break
-        results = retriever.search(query, top_k=3)
-        if not results:
-            console.print(Panel("I could not find an answer.", title="No Match"))
-            continue
-        score, hit = results[0]
-        console.print(Panel(format_answer(hit), title=f"Match score: {score:.3f}"))
+        show_match(best_matches(retriever, [query], corpora)[0], console)
+    print_stats(retriever, console)
 
 
 if __name__ == "__main__":
-    chat_loop()
+    parser = argparse.ArgumentParser(description="College Placement QA Chatbot")
+    parser.add_argument("--server", action="store_true", help="Query a running `python -m app.server` instead of loading the model")
+    parser.add_argument("--watch", action="store_true", help="pick up newly published index versions while chatting")
+    parser.add_argument("--corpus", action="append", metavar="NAME",
+                        help="answer from a named corpus in Paths.corpora (repeat to search several)")
+    parser.add_argument("--startup-profile", action="store_true", help="Print an import/initialisation time breakdown")
+    args = parser.parse_args()
+    profile.enabled = args.startup_profile
+    chat_loop(use_server=args.server, watch=args.watch, corpora=args.corpus)
 
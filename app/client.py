@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import json
+import http.client
+from typing import List, Dict, Tuple
+
+from app.config import server_cfg
+
+
+class RetrievalClient:
+    # Same search API as Retriever, served by `python -m app.server`.
+    def __init__(self, host: str | None = None, port: int | None = None, timeout: float = 30.0) -> None:
+        self.host = host or server_cfg.host
+        self.port = port or server_cfg.port
+        self.timeout = timeout
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _request(self, method: str, path: str, payload: Dict | None = None) -> Dict:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        for attempt in range(2):
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                data = json.loads(response.read())
+                break
+            except (ConnectionError, http.client.HTTPException):
+                # The keep-alive connection was dropped (e.g. server restart): reconnect once.
+                self.conn.close()
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                if attempt:
+                    raise
+        if response.status != 200:
+            raise RuntimeError(f"Retrieval server error {response.status}: {data.get('error')}")
+        return data
+
+    def search(
+        self, query: str, top_k: int | None = None, filters: Dict | None = None, corpus: str | None = None
+    ) -> List[Tuple[float, Dict]]:
+        payload = {"query": query, "top_k": top_k, "filters": filters, "corpus": corpus}
+        data = self._request("POST", "/search", payload)
+        return [(float(score), hit) for score, hit in data["results"]]
+
+    def search_batch(
+        self, queries: List[str], top_k: int | None = None, filters: Dict | None = None, corpus: str | None = None
+    ) -> List[List[Tuple[float, Dict]]]:
+        payload = {"queries": queries, "top_k": top_k, "filters": filters, "corpus": corpus}
+        data = self._request("POST", "/search_batch", payload)
+        return [[(float(score), hit) for score, hit in results] for results in data["results"]]
+
+    def search_corpora(
+        self, queries: List[str], corpora: List[str], top_k: int | None = None, filters: Dict | None = None
+    ) -> List[Dict[str, List[Tuple[float, Dict]]]]:
+        payload = {"queries": queries, "top_k": top_k, "filters": filters, "corpus": list(corpora)}
+        data = self._request("POST", "/search_batch", payload)
+        return [
+            {name: [(float(score), hit) for score, hit in hits] for name, hits in results.items()}
+            for results in data["results"]
+        ]
+
+    def stats(self) -> Dict[str, float]:
+        return self._request("GET", "/stats")
+
+    def close(self) -> None:
+        self.conn.close()
@@ -1,6 +1,6 @@
 import os
-from dataclasses import dataclass
-from typing import List
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple
 
 # Load environment variables from .env file
 try:
@@ -14,7 +14,16 @@ except ImportError:
 class Paths:
     data_path: str = os.path.join(os.getcwd(), "Vice_dataset_with_infra.csv")
     model_dir: str = os.path.join(os.getcwd(), "models", "bi_encoder")
+    cross_encoder_dir: str = os.path.join(os.getcwd(), "models", "cross_encoder")
     index_dir: str = os.path.join(os.getcwd(), "indexes")
+    # Parsed-CSV snapshots (app/dataset_cache.py), invalidated when the CSV changes.
+    cache_dir: str = os.path.join(os.getcwd(), "cache")
+    # Named corpora for multi-corpus serving (`--corpus NAME` on build_index, server and chat): name -> CSV.
+    # Each is indexed under index_dir/corpora/<name>/; one process serves them all with one encoder.
+    corpora: Dict[str, str] = field(default_factory=lambda: {
+        "vice": os.path.join(os.getcwd(), "Vice_dataset_with_infra.csv"),
+        "vica": os.path.join(os.getcwd(), "VICA_DATASET_UPDATION.csv"),
+    })
 
 
 @dataclass
@@ -26,21 +35,118 @@ class TrainingConfig:
     learning_rate: float = 2e-5
     warmup_ratio: float = 0.05
     seed: int = 42
+    # Cross-encoder re-ranker fine-tuned by app/train_reranker.py on the same question/context pairs.
+    base_cross_encoder_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    reranker_epochs: int = 1
+    reranker_negatives: int = 3
+    max_reranker_pairs: int | None = 10000
+    # Matryoshka training: MultipleNegativesRankingLoss is applied to each prefix of the embedding
+    # (e.g. (384, 256, 128, 64)) so truncated vectors stay usable. None trains full-size vectors only.
+    matryoshka_dims: Tuple[int, ...] | None = None
 
 
 @dataclass
 class IndexConfig:
     top_k: int = 5
+    # "exact" scans every row; "ivf" builds an inverted-file index (app/ann.py) and probes the closest lists.
+    ann_type: str = "exact"
+    ivf_nlist: int | None = None  # None -> sqrt(rows)
+    ivf_nprobe: int = 8
+    # Below this many rows the retriever ignores the ANN index and scans exactly.
+    ann_min_rows: int = 20000
+    # LRU cache of query embeddings keyed by the normalised query text (0 disables it).
+    query_cache_size: int = 1024
+    query_cache_persist: bool = False
+    # Answer queries that exactly match a dataset question (after folding case/punctuation) without encoding.
+    exact_match: bool = True
+    # Fill exact matches that have fewer than top_k rows with dense hits. This runs the encoder, so such
+    # queries are counted as exact_encoded rather than exact_hits.
+    exact_pad: bool = False
+    # Fuse BM25 (questions, title, tags) and fuzzy entity-name matches with dense scores via reciprocal rank fusion.
+    hybrid: bool = False
+    rrf_k: int = 60
+    lexical_candidates: int = 50
+    fuzzy_score_cutoff: float = 85.0
+    # Score only the lexical candidates with the dense model (full scan when nothing matches lexically).
+    lexical_prefilter: bool = False
+    # "float16" or "int8" writes a compact copy that the retriever scans first, rescoring
+    # the best rescore_candidates rows against the float32 embeddings.
+    embedding_dtype: str = "float32"
+    rescore_candidates: int = 50
+    # Open embedding matrices with mmap so worker processes share one page-cache copy.
+    mmap_embeddings: bool = True
+    # Query/index encoder: "fp32", "int8" (dynamic quantization of Linear layers) or "compile" (torch.compile).
+    encoder_backend: str = "fp32"
+    encoder_threads: int | None = None  # torch intra-op threads; None keeps torch's default
+    # Minimum mean top-k overlap with the fp32 model for `python -m app.benchmarks backend` to pass.
+    parity_min_overlap: float = 0.9
+    # Re-rank the top rerank_candidates hits with the cross-encoder in paths.cross_encoder_dir.
+    # The candidate list is truncated (or re-ranking skipped) to stay within rerank_budget_ms per request.
+    rerank: bool = False
+    rerank_candidates: int = 20
+    rerank_budget_ms: float = 150.0
+    # Adaptive cascade: exact question match -> compact dense scan -> full-precision rescoring and
+    # re-ranking, where the last stage only runs when the top-1/top-2 score margin is below cascade_margin.
+    cascade: bool = False
+    cascade_margin: float = 0.05
+    # First-pass search on the first search_dim components of each embedding, re-normalised (for models
+    # trained with matryoshka_dims). The top rescore_candidates rows are rescored at full dimension
+    # unless search_dim_rescore is False. None searches at full dimension.
+    search_dim: int | None = None
+    search_dim_rescore: bool = True
+    # Collapse rows whose embeddings have cosine >= dedup_threshold and whose answer, title/entity_name and
+    # Category/Sub_Category match into one canonical row (in-memory build only). The kept record lists its
+    # cluster's ids in "member_ids". None keeps every row.
+    dedup_threshold: float | None = None
+    dedup_block_size: int = 1024
+    # Streaming build (`python -m app.build_index --stream`): read, encode and write stream_chunk_rows
+    # rows at a time, so peak memory follows the chunk size instead of the corpus size.
+    stream_build: bool = False
+    stream_chunk_rows: int = 10000
+    # Also write metadata.jsonl (one JSON record per row) next to the columnar store, for inspection
+    # and for readers that predate it. The retriever only reads it for indexes without indexes/metadata/.
+    metadata_jsonl: bool = False
+    # Index encoding sorts texts by token count and packs each batch up to encode_token_budget padded
+    # tokens (at most encode_max_batch_size texts). max_seq_length=None keeps the model's own limit.
+    max_seq_length: int | None = None
+    encode_token_budget: int = 16384
+    encode_max_batch_size: int = 256
+    # Encode index batches in this many processes, each with its own model copy and
+    # encode_worker_threads torch threads (None -> cpu_count // encode_workers). 1 encodes in-process.
+    encode_workers: int = 1
+    encode_worker_threads: int | None = None
+    # Builds are written to index_dir/versions/<version>/ and published by swapping index_dir/CURRENT;
+    # keep_versions older versions stay on disk for rollback (`python -m app.bundles --publish`).
+    keep_versions: int = 2
+    # Retriever(watch=True) polls CURRENT every reload_interval_s and swaps in a newly published version
+    # in the background, after checking it against its manifest checksums when reload_verify is set.
+    reload_interval_s: float = 2.0
+    reload_verify: bool = True
+    # `python -m app.build_index --watch` checks paths.data_path every watch_interval_s and rebuilds once
+    # it has been unchanged for watch_debounce_s, so editors that save in several writes cause one build.
+    watch_interval_s: float = 1.0
+    watch_debounce_s: float = 2.0
+
+
+@dataclass
+class ServerConfig:
+    host: str = "127.0.0.1"
+    port: int = 8765
+    # Queries arriving within max_wait_ms of the first one are encoded and scored together.
+    max_batch_size: int = 32
+    max_wait_ms: float = 5.0
 
 
 paths = Paths()
 train_cfg = TrainingConfig()
 index_cfg = IndexConfig()
+server_cfg = ServerConfig()
 
 
 def ensure_directories() -> None:
     os.makedirs(os.path.dirname(paths.model_dir), exist_ok=True)
     os.makedirs(paths.model_dir, exist_ok=True)
+    os.makedirs(paths.cross_encoder_dir, exist_ok=True)
     os.makedirs(paths.index_dir, exist_ok=True)
     
 
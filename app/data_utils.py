@@ -1,8 +1,14 @@
 from __future__ import annotations
 
+import os
+import re
+import codecs
+import numpy as np
 import pandas as pd
 from typing import List, Dict, Tuple
 
+from app.dataset_cache import load_snapshot, save_snapshot
+
 
 CSV_COLUMNS = [
     "id",
@@ -15,28 +21,86 @@ CSV_COLUMNS = [
 ]
 
 
-def load_dataset(csv_path: str) -> pd.DataFrame:
-    # Try different encodings to handle various file formats
-    encodings = ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252', 'iso-8859-1']
-    
+ENCODINGS = ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252', 'iso-8859-1']
+
+
+def detect_encoding(csv_path: str, sample_size: int = 1 << 20) -> List[str]:
+    # Decode a byte sample instead of parsing the whole CSV once per candidate encoding.
+    # Returns the encodings to try, best guess first, in the original preference order.
+    with open(csv_path, "rb") as f:
+        sample = f.read(sample_size)
+        complete = not f.read(1)
+    candidates = []
+    for encoding in ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=complete)
+        except UnicodeDecodeError:
+            print(f"Sample does not decode as {encoding}, skipping")
+            continue
+        candidates.append(encoding)
+    return candidates
+
+
+def load_dataset(csv_path: str, use_cache: bool = True) -> pd.DataFrame:
+    if use_cache:
+        df = load_snapshot(csv_path)
+        if df is not None:
+            print(f"Loaded cached snapshot of {os.path.basename(csv_path)}")
+            return df
+
+    encodings = detect_encoding(csv_path)
     for encoding in encodings:
         try:
             df = pd.read_csv(csv_path, encoding=encoding)
             print(f"Successfully loaded CSV with {encoding} encoding")
             break
         except UnicodeDecodeError:
+            # The sample decoded but a later part of the file did not.
             print(f"Failed to load with {encoding} encoding, trying next...")
             continue
     else:
-        raise ValueError(f"Could not load CSV file with any of the tried encodings: {encodings}")
-    
+        raise ValueError(f"Could not load CSV file with any of the tried encodings: {ENCODINGS}")
+
     # Ensure expected columns exist
     missing = [c for c in CSV_COLUMNS if c not in df.columns]
     if missing:
         raise ValueError(f"Missing columns in CSV: {missing}")
+    if use_cache:
+        save_snapshot(csv_path, df, encoding)
     return df
 
 
+def _common_dtype(dtypes: List) -> object:
+    # The dtype read_csv would infer for the whole column, given the dtypes it inferred per chunk.
+    if len(set(dtypes)) == 1:
+        return dtypes[0]
+    if all(pd.api.types.is_numeric_dtype(d) and not pd.api.types.is_bool_dtype(d) for d in dtypes):
+        return np.float64
+    return object
+
+
+def scan_dataset(csv_path: str, chunk_rows: int) -> Tuple[str, int, Dict[str, object]]:
+    # First pass of a streaming build: find an encoding that decodes the whole file, count its rows
+    # and collect per-chunk column dtypes, holding at most one chunk in memory. Casting each chunk to
+    # the returned dtypes makes chunked reads match a single read_csv (e.g. ids with gaps stay float).
+    for encoding in detect_encoding(csv_path):
+        rows = 0
+        seen: Dict[str, List] = {}
+        try:
+            for chunk in pd.read_csv(csv_path, encoding=encoding, chunksize=chunk_rows):
+                rows += len(chunk)
+                for column, dtype in chunk.dtypes.items():
+                    seen.setdefault(column, []).append(dtype)
+        except UnicodeDecodeError:
+            print(f"Failed to scan with {encoding} encoding, trying next...")
+            continue
+        missing = [c for c in CSV_COLUMNS if c not in seen]
+        if missing:
+            raise ValueError(f"Missing columns in CSV: {missing}")
+        return encoding, rows, {column: _common_dtype(dtypes) for column, dtypes in seen.items()}
+    raise ValueError(f"Could not load CSV file with any of the tried encodings: {ENCODINGS}")
+
+
 def build_context_text(row: pd.Series) -> str:
     parts: List[str] = []
     if pd.notna(row.get("Category")):
@@ -52,26 +116,80 @@ def build_context_text(row: pd.Series) -> str:
     return " \n ".join(parts)
 
 
-def expand_training_pairs(df: pd.DataFrame, max_pairs: int | None = None) -> List[Tuple[str, str]]:
-    pairs: List[Tuple[str, str]] = []
-    for _, row in df.iterrows():
-        context = build_context_text(row)
-        raw_questions = row.get("questions") or ""
-        for q in str(raw_questions).splitlines():
-            question = q.strip().strip('"')
-            if not question:
+CONTEXT_FIELDS = [
+    ("Category", "Category"),
+    ("Sub_Category", "Sub-Category"),
+    ("title/entity_name", "Title"),
+    ("answers", "Answer"),
+    ("additional_info/tags", "Tags"),
+]
+CONTEXT_SEPARATOR = " \n "
+
+# Same line boundaries as str.splitlines(), with "\r\n" first so it counts as one break.
+_LINE_BREAK_RE = r"\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]"
+
+
+def build_context_texts(df: pd.DataFrame) -> pd.Series:
+    # Column-wise equivalent of build_context_text: every present field is prefixed with the
+    # separator, so dropping the first separator yields the joined string (or "" if nothing is present).
+    context = np.full(len(df), "", dtype=object)
+    for column, label in CONTEXT_FIELDS:
+        if column not in df.columns:
+            continue
+        values = df[column]
+        present = values.notna().to_numpy()
+        context[present] += (CONTEXT_SEPARATOR + label + ": " + values[present].astype(str)).to_numpy(dtype=object)
+    return pd.Series(context, index=df.index, dtype=object).str.slice(len(CONTEXT_SEPARATOR))
+
+
+def split_questions(raw_questions) -> List[str]:
+    if raw_questions is None or (isinstance(raw_questions, float) and pd.isna(raw_questions)):
+        return []
+    questions: List[str] = []
+    for q in str(raw_questions).splitlines():
+        question = q.strip().strip('"')
+        if question:
+            questions.append(question)
+    return questions
+
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+
+
+def normalize_question(text: str) -> str:
+    return " ".join(_PUNCT_RE.sub(" ", text.lower()).split())
+
+
+def question_lookup(records: List[Dict], table: Dict[str, List[int]] | None = None, start: int = 0) -> Dict[str, List[int]]:
+    # `table`/`start` let a streaming build extend one table chunk by chunk.
+    if table is None:
+        table = {}
+    for idx, record in enumerate(records, start):
+        for question in split_questions(record.get("questions")):
+            key = normalize_question(question)
+            if not key:
                 continue
-            pairs.append((question, context))
-            if max_pairs is not None and len(pairs) >= max_pairs:
-                return pairs
-    return pairs
+            rows = table.setdefault(key, [])
+            if not rows or rows[-1] != idx:
+                rows.append(idx)
+    return table
 
 
-def records_with_context(df: pd.DataFrame) -> List[Dict]:
-    records: List[Dict] = []
-    for _, row in df.iterrows():
-        record = row.to_dict()
-        record["context_text"] = build_context_text(row)
-        records.append(record)
-    return records
+def expand_training_pairs(df: pd.DataFrame, max_pairs: int | None = None) -> List[Tuple[str, str]]:
+    contexts = build_context_texts(df).reset_index(drop=True)
+    raw = df["questions"].reset_index(drop=True) if "questions" in df.columns else pd.Series("", index=contexts.index, dtype=object)
+    # Matches `row.get("questions") or ""`: falsy cells become "", while NaN is truthy and becomes "nan".
+    raw = raw.astype(object).map(lambda value: str(value or ""))
+    questions = raw.str.split(_LINE_BREAK_RE, regex=True).explode()
+    questions = questions.str.strip().str.strip('"')
+    questions = questions[questions.notna() & (questions != "")]
+    if max_pairs is not None:
+        questions = questions.iloc[:max(max_pairs, 1)]
+    return list(zip(questions.tolist(), contexts.loc[questions.index].tolist()))
 
+
+def records_with_context(df: pd.DataFrame) -> List[Dict]:
+    # zip over column lists is several times faster than DataFrame.to_dict("records") and yields the same values.
+    columns = list(df.columns) + ["context_text"]
+    values = [df[c].tolist() for c in df.columns] + [build_context_texts(df).tolist()]
+    return [dict(zip(columns, row)) for row in zip(*values)]
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import os
+import json
+import hashlib
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.config import paths
+
+
+SNAPSHOT_VERSION = 1
+
+
+def file_sha1(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def snapshot_paths(csv_path: str) -> Tuple[str, str]:
+    key = hashlib.sha1(os.path.abspath(csv_path).encode("utf-8")).hexdigest()[:16]
+    base = os.path.join(paths.cache_dir, f"dataset_{key}")
+    return base + ".npz", base + ".json"
+
+
+def _write_meta(meta_path: str, meta: Dict) -> None:
+    tmp = meta_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+
+
+def _source_key(csv_path: str) -> Dict:
+    st = os.stat(csv_path)
+    return {"path": os.path.abspath(csv_path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def save_snapshot(csv_path: str, df: pd.DataFrame, encoding: str, content_hash: str | None = None) -> None:
+    # Numeric columns are stored as-is; text columns as one UTF-8 blob plus character offsets and a
+    # missing-value mask, so loading needs neither CSV parsing nor pickle.
+    arrays: Dict[str, np.ndarray] = {}
+    columns = []
+    for i, column in enumerate(df.columns):
+        values = df[column]
+        if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            arrays[f"c{i}"] = values.to_numpy()
+            columns.append({"name": column, "kind": "numeric", "dtype": str(values.dtype)})
+            continue
+        missing = values.isna().to_numpy()
+        texts = ["" if m else str(v) for v, m in zip(values.tolist(), missing)]
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum([len(t) for t in texts], out=offsets[1:])
+        arrays[f"c{i}"] = np.frombuffer("".join(texts).encode("utf-8"), dtype=np.uint8)
+        arrays[f"c{i}_offsets"] = offsets
+        arrays[f"c{i}_missing"] = missing
+        columns.append({"name": column, "kind": "text", "dtype": str(values.dtype)})
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "source": _source_key(csv_path),
+        "sha1": content_hash or file_sha1(csv_path),
+        "encoding": encoding,
+        "rows": len(df),
+        "columns": columns,
+    }
+    os.makedirs(paths.cache_dir, exist_ok=True)
+    data_path, meta_path = snapshot_paths(csv_path)
+    tmp = data_path + ".tmp.npz"
+    np.savez(tmp, **arrays)
+    os.replace(tmp, data_path)
+    # The metadata is written last, so a snapshot is only trusted once its arrays are complete.
+    _write_meta(meta_path, meta)
+
+
+def load_snapshot(csv_path: str) -> pd.DataFrame | None:
+    data_path, meta_path = snapshot_paths(csv_path)
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        data = np.load(data_path)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != SNAPSHOT_VERSION:
+        return None
+    source = _source_key(csv_path)
+    if meta["source"] != source:
+        # Size/mtime changed (or the file was copied): only reuse the snapshot if the bytes are the same.
+        if meta["source"]["size"] != source["size"] or meta["sha1"] != file_sha1(csv_path):
+            return None
+        meta["source"] = source
+        _write_meta(meta_path, meta)
+    frame: Dict[str, pd.Series] = {}
+    for i, column in enumerate(meta["columns"]):
+        if column["kind"] == "numeric":
+            frame[column["name"]] = pd.Series(data[f"c{i}"], dtype=column["dtype"])
+            continue
+        text = data[f"c{i}"].tobytes().decode("utf-8")
+        offsets = data[f"c{i}_offsets"].tolist()
+        values = np.array([text[a:b] for a, b in zip(offsets[:-1], offsets[1:])], dtype=object)
+        values[data[f"c{i}_missing"]] = np.nan
+        frame[column["name"]] = pd.Series(values, dtype=object).astype(column["dtype"])
+    df = pd.DataFrame(frame)
+    if len(df) != meta["rows"]:
+        return None
+    return df
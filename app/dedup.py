@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import math
+from typing import List, Dict, Tuple
+
+import numpy as np
+
+from app.ann import _assign, train_centroids
+from app.config import index_cfg
+from app.data_utils import normalize_question, split_questions
+from app.partitions import PARTITION_FIELDS
+
+
+# Rows only collapse when these agree (after normalisation) as well as their embeddings. The title is
+# shown with the answer and indexed as an entity name for hybrid search, so it must survive as well.
+DEDUP_FIELDS = ("answers", "title/entity_name") + PARTITION_FIELDS
+
+
+def _leader_join(embeddings: np.ndarray, rows: np.ndarray, threshold: float, block_size: int, canonical: np.ndarray) -> None:
+    # Greedy leader clustering in row order: a row joins the most similar earlier leader with
+    # cosine >= threshold, otherwise it becomes a leader. Rows are compared block by block against
+    # the leaders found so far, so memory is block_size x leaders rather than n x n, and clusters do
+    # not chain (every member is within the threshold of its leader).
+    leaders = np.empty(0, dtype=np.int64)
+    leader_vecs = np.empty((0, embeddings.shape[1]), dtype=np.float32)
+    for start in range(0, len(rows), block_size):
+        block_rows = rows[start:start + block_size]
+        block = np.asarray(embeddings[block_rows], dtype=np.float32)
+        assigned = np.full(len(block_rows), -1, dtype=np.int64)
+        if len(leaders):
+            sims = block @ leader_vecs.T
+            best = np.argmax(sims, axis=1)
+            hit = sims[np.arange(len(best)), best] >= threshold
+            assigned[hit] = leaders[best[hit]]
+        # Rows left over may still duplicate each other within the block.
+        rest = np.flatnonzero(assigned < 0)
+        inner = block[rest] @ block[rest].T
+        new_leaders: List[int] = []
+        for j, pos in enumerate(rest):
+            if new_leaders:
+                sims = inner[j, new_leaders]
+                k = int(np.argmax(sims))
+                if sims[k] >= threshold:
+                    assigned[pos] = block_rows[rest[new_leaders[k]]]
+                    continue
+            new_leaders.append(j)
+            assigned[pos] = block_rows[pos]
+        canonical[block_rows] = assigned
+        fresh = rest[new_leaders]
+        leaders = np.concatenate([leaders, block_rows[fresh]])
+        leader_vecs = np.concatenate([leader_vecs, block[fresh]])
+
+
+def near_duplicate_clusters(embeddings: np.ndarray, threshold: float, block_size: int | None = None) -> np.ndarray:
+    # Returns canonical[i]: the leader row of row i's cluster (canonical[i] == i for leaders).
+    # Large corpora are first split into IVF lists and joined list by list; near-duplicates at a high
+    # threshold land in the same list, so only an occasional pair across list borders is missed.
+    block_size = block_size or index_cfg.dedup_block_size
+    canonical = np.arange(len(embeddings), dtype=np.int64)
+    if len(embeddings) < index_cfg.ann_min_rows:
+        _leader_join(embeddings, canonical.copy(), threshold, block_size, canonical)
+        return canonical
+    nlist = max(1, int(math.sqrt(len(embeddings))))
+    labels = _assign(embeddings, train_centroids(embeddings, nlist))
+    order = np.argsort(labels, kind="stable")
+    bounds = np.searchsorted(labels[order], np.arange(nlist + 1))
+    for l in range(nlist):
+        _leader_join(embeddings, order[bounds[l]:bounds[l + 1]], threshold, block_size, canonical)
+    return canonical
+
+
+def _dedup_key(record: Dict) -> Tuple:
+    key = []
+    for field in DEDUP_FIELDS:
+        value = record.get(field)
+        if value is None or value != value:
+            key.append(None)
+        else:
+            # Titles are displayed verbatim, so only surrounding whitespace is ignored.
+            key.append(str(value).strip() if field == "title/entity_name" else normalize_question(str(value)))
+    return tuple(key)
+
+
+def split_clusters(records: List[Dict], canonical: np.ndarray) -> np.ndarray:
+    # Templated rows ("package from DeltaX in 2024-2025" vs "... 2023-2024") embed almost identically
+    # but answer differently, so a cosine cluster is split by answer, title and filterable fields. Each part
+    # is led by its first row, so canonical[i] <= i still holds.
+    leaders: Dict[Tuple, int] = {}
+    out = np.empty_like(canonical)
+    for row, leader in enumerate(canonical.tolist()):
+        out[row] = leaders.setdefault((leader, _dedup_key(records[row])), row)
+    return out
+
+
+def collapse_records(records: List[Dict], canonical: np.ndarray) -> Tuple[np.ndarray, List[Dict]]:
+    # One record per cluster: the leader's fields, the union of its members' questions (so exact and
+    # BM25 matches on a member's wording still reach the cluster) and the member record ids. Clusters
+    # must come from split_clusters, so every member has the leader's answer, title and filter fields.
+    keep = np.flatnonzero(canonical == np.arange(len(canonical)))
+    position = {int(row): i for i, row in enumerate(keep)}
+    members: List[List[int]] = [[] for _ in keep]
+    for row, leader in enumerate(canonical.tolist()):
+        members[position[leader]].append(row)
+    collapsed: List[Dict] = []
+    for row, rows in zip(keep.tolist(), members):
+        record = dict(records[row])
+        if len(rows) > 1:
+            questions = list(dict.fromkeys(q for r in rows for q in split_questions(records[r].get("questions"))))
+            record["questions"] = "\n".join(questions) if questions else record.get("questions")
+        ids = [records[r].get("id") for r in rows]
+        record["member_ids"] = [None if value is None or value != value else value for value in ids]
+        collapsed.append(record)
+    return keep, collapsed
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import os
+from collections import OrderedDict
+from typing import Dict
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    # The bi-encoder is uncased, so folding case and whitespace never changes the embedding.
+    return " ".join(text.lower().split())
+
+
+class QueryEmbeddingCache:
+    def __init__(self, max_size: int, fingerprint: str) -> None:
+        self.max_size = max_size
+        self.fingerprint = fingerprint
+        self.entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: str) -> np.ndarray | None:
+        vec = self.entries.get(key)
+        if vec is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return vec
+
+    def put(self, key: str, vec: np.ndarray) -> None:
+        if self.max_size <= 0:
+            return
+        self.entries[key] = vec
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def reset(self, fingerprint: str) -> None:
+        self.fingerprint = fingerprint
+        self.entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def save(self, path: str) -> None:
+        if not self.entries:
+            return
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            fingerprint=np.array(self.fingerprint),
+            keys=np.array(list(self.entries.keys())),
+            vectors=np.stack(list(self.entries.values())),
+        )
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> None:
+        if not os.path.exists(path):
+            return
+        data = np.load(path)
+        if str(data["fingerprint"]) != self.fingerprint:
+            print("Model changed, discarding persisted query cache")
+            return
+        for key, vec in zip(data["keys"], data["vectors"]):
+            self.put(str(key), vec)
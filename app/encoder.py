@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import os
+import time
+from typing import List, Dict, TYPE_CHECKING
+
+import numpy as np
+
+from app.ann import top_k_rows
+from app.config import paths, index_cfg
+from app.fingerprints import model_fingerprint
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+
+ENCODER_BACKENDS = ("fp32", "int8", "compile")
+
+
+def encoder_fingerprint(model_dir: str | None = None, backend: str | None = None) -> str:
+    # int8 weights shift the embeddings slightly, so vectors from different backends must not be mixed.
+    fingerprint = f"{model_fingerprint(model_dir or paths.model_dir)}:{backend or index_cfg.encoder_backend}"
+    if index_cfg.max_seq_length:
+        fingerprint += f":len{index_cfg.max_seq_length}"
+    return fingerprint
+
+
+def load_encoder(model_dir: str | None = None, backend: str | None = None, threads: int | None = None) -> SentenceTransformer:
+    backend = backend or index_cfg.encoder_backend
+    threads = threads if threads is not None else index_cfg.encoder_threads
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder_backend: {backend}")
+    # torch and sentence_transformers take seconds to import, so only code paths that encode pay for them.
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    if threads:
+        torch.set_num_threads(threads)
+    if backend == "fp32":
+        model = SentenceTransformer(model_dir or paths.model_dir)
+        if index_cfg.max_seq_length:
+            model.max_seq_length = index_cfg.max_seq_length
+        return model
+    model = SentenceTransformer(model_dir or paths.model_dir, device="cpu")
+    if index_cfg.max_seq_length:
+        model.max_seq_length = index_cfg.max_seq_length
+    model.eval()
+    if backend == "int8":
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    # dynamic=True avoids a recompile for every new padded sequence length.
+    model[0].auto_model = torch.compile(model[0].auto_model, dynamic=True)
+    return model
+
+
+def token_lengths(model: SentenceTransformer, texts: List[str]) -> np.ndarray:
+    # Untruncated lengths including special tokens, i.e. what the model would see without max_seq_length.
+    encoded = model.tokenizer(texts, add_special_tokens=True, truncation=False, verbose=False)
+    return np.fromiter((len(ids) for ids in encoded["input_ids"]), dtype=np.int64, count=len(texts))
+
+
+def token_budget_batches(lengths: np.ndarray, token_budget: int, max_batch_size: int) -> List[np.ndarray]:
+    # Longest first, so the first batch shows the worst-case memory use straight away. A batch grows
+    # until its padded size (texts x longest text) would exceed the token budget.
+    order = np.argsort(-lengths, kind="stable")
+    batches: List[np.ndarray] = []
+    start = 0
+    while start < len(order):
+        width = max(int(lengths[order[start]]), 1)
+        size = max(1, min(max_batch_size, token_budget // width))
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+
+def _encode_batch(model: SentenceTransformer, texts: List[str]) -> np.ndarray:
+    return model.encode(
+        texts,
+        batch_size=len(texts),
+        convert_to_numpy=True,
+        show_progress_bar=False,
+        normalize_embeddings=True,
+    ).astype(np.float32, copy=False)
+
+
+_worker_model: SentenceTransformer | None = None
+
+
+def _init_worker(model_dir: str, backend: str, threads: int, max_seq_length: int | None) -> None:
+    global _worker_model
+    index_cfg.max_seq_length = max_seq_length
+    _worker_model = load_encoder(model_dir, backend, threads)
+
+
+def _worker_encode(texts: List[str]) -> np.ndarray:
+    return _encode_batch(_worker_model, texts)
+
+
+class EncoderPool:
+    # Worker processes that each load their own encoder with `threads` torch threads. The parent
+    # still forms the batches, so every batch is encoded exactly as the serial path would encode it.
+    def __init__(self, workers: int, threads: int | None = None, model_dir: str | None = None, backend: str | None = None) -> None:
+        import multiprocessing as mp
+
+        self.workers = workers
+        self.threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        # spawn: forking a parent that already initialised torch's thread pools can deadlock.
+        self.pool = mp.get_context("spawn").Pool(
+            workers,
+            initializer=_init_worker,
+            initargs=(model_dir or paths.model_dir, backend or index_cfg.encoder_backend, self.threads, index_cfg.max_seq_length),
+        )
+
+    def imap(self, batches: List[List[str]]):
+        # Ordered results; chunksize=1 hands out batches one at a time, so long and short ones balance.
+        return self.pool.imap(_worker_encode, batches, chunksize=1)
+
+    def close(self) -> None:
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self) -> "EncoderPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if exc[0] is not None:
+            self.pool.terminate()
+        self.close()
+
+
+def new_encode_stats() -> Dict[str, float]:
+    return {"texts": 0, "tokens": 0, "padded_tokens": 0, "truncated": 0, "seconds": 0.0}
+
+
+def encode_corpus(
+    model: SentenceTransformer,
+    texts: List[str],
+    stats: Dict[str, float] | None = None,
+    token_budget: int | None = None,
+    max_batch_size: int | None = None,
+    show_progress_bar: bool = False,
+    pool: EncoderPool | None = None,
+) -> np.ndarray:
+    # Index-side encoding: length-bucketed batches so short rows are not padded to the longest row in
+    # the corpus. `stats` accumulates counts across calls (streaming builds encode chunk by chunk).
+    # With a pool the batches are encoded by its workers; results land in the same rows either way.
+    from tqdm.auto import tqdm
+
+    token_budget = token_budget or index_cfg.encode_token_budget
+    max_batch_size = max_batch_size or index_cfg.encode_max_batch_size
+    start = time.perf_counter()
+    max_len = model.max_seq_length
+    lengths = token_lengths(model, texts)
+    effective = np.minimum(lengths, max_len) if max_len else lengths
+    batches = token_budget_batches(effective, token_budget, max_batch_size)
+    out: np.ndarray | None = None
+    batch_texts = ([texts[i] for i in batch] for batch in batches)
+    results = pool.imap(list(batch_texts)) if pool else (_encode_batch(model, b) for b in batch_texts)
+    for batch, vecs in tqdm(zip(batches, results), total=len(batches), desc="Encoding", disable=not show_progress_bar):
+        if out is None:
+            out = np.empty((len(texts), vecs.shape[1]), dtype=np.float32)
+        out[batch] = vecs
+    if stats is not None:
+        stats["texts"] += len(texts)
+        stats["tokens"] += int(effective.sum())
+        stats["padded_tokens"] += sum(int(effective[batch].max()) * len(batch) for batch in batches)
+        stats["truncated"] += int(np.count_nonzero(lengths > max_len)) if max_len else 0
+        stats["seconds"] += time.perf_counter() - start
+    return out
+
+
+def format_encode_stats(stats: Dict[str, float], max_seq_length: int | None) -> str:
+    seconds = max(stats["seconds"], 1e-9)
+    padding = stats["tokens"] / stats["padded_tokens"] if stats["padded_tokens"] else 1.0
+    return (
+        f"Encoded {stats['texts']} texts in {stats['seconds']:.1f}s: {stats['texts'] / seconds:.1f} texts/s, "
+        f"{stats['tokens'] / seconds:.0f} tokens/s, {padding:.0%} of batch tokens are real; "
+        f"{stats['truncated']} truncated at max_seq_length={max_seq_length}"
+    )
+
+
+def parity_check(
+    reference: SentenceTransformer,
+    candidate: SentenceTransformer,
+    queries: List[str],
+    embeddings: np.ndarray,
+    top_k: int,
+) -> Dict[str, float]:
+    ref_vecs = reference.encode(queries, batch_size=64, normalize_embeddings=True)
+    cand_vecs = candidate.encode(queries, batch_size=64, normalize_embeddings=True)
+    ref_top = top_k_rows(ref_vecs @ embeddings.T, top_k)
+    cand_top = top_k_rows(cand_vecs @ embeddings.T, top_k)
+    overlap = [len(set(r.tolist()) & set(c.tolist())) / top_k for r, c in zip(ref_top, cand_top)]
+    return {
+        "top_k_overlap": float(np.mean(overlap)),
+        "top1_agreement": float(np.mean(ref_top[:, 0] == cand_top[:, 0])),
+        "min_cosine": float(np.min(np.sum(ref_vecs * cand_vecs, axis=1))),
+    }
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import os
+import hashlib
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def model_fingerprint(model_dir: str) -> str:
+    # Cheap stat-based fingerprint: any retrain rewrites the weight files, which changes size/mtime.
+    h = hashlib.sha1()
+    for root, dirs, files in os.walk(model_dir):
+        dirs.sort()
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            st = os.stat(full)
+            rel = os.path.relpath(full, model_dir).replace(os.sep, "/")
+            h.update(f"{rel}:{st.st_size}:{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import re
+import math
+from typing import List, Dict, Tuple
+
+import numpy as np
+from rapidfuzz import process, fuzz, utils
+
+from app.ann import top_k_indices
+from app.data_utils import split_questions
+
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _field(record: Dict, column: str) -> str:
+    value = record.get(column)
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return str(value).strip()
+
+
+def lexical_text(record: Dict) -> str:
+    parts = split_questions(record.get("questions"))
+    parts.append(_field(record, "title/entity_name"))
+    parts.append(_field(record, "additional_info/tags"))
+    return " ".join(parts)
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking.tolist()):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (k + rank + 1)
+    if not fused:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    rows = np.fromiter(fused.keys(), dtype=np.int64, count=len(fused))
+    scores = np.fromiter(fused.values(), dtype=np.float32, count=len(fused))
+    order = np.argsort(-scores, kind="stable")
+    return rows[order], scores[order]
+
+
+class LexicalIndex:
+    # BM25 over questions, title/entity_name and tags stored as CSR postings, plus fuzzy entity-name matching.
+    def __init__(
+        self,
+        vocab: List[str],
+        offsets: np.ndarray,
+        post_rows: np.ndarray,
+        post_tfs: np.ndarray,
+        doc_len: np.ndarray,
+        entity_names: List[str],
+        entity_offsets: np.ndarray,
+        entity_rows: np.ndarray,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ) -> None:
+        self.vocab = vocab
+        self.term_ids = {term: i for i, term in enumerate(vocab)}
+        self.offsets = offsets
+        self.post_rows = post_rows
+        self.post_tfs = post_tfs
+        self.doc_len = doc_len
+        self.avg_len = float(doc_len.mean()) if len(doc_len) else 0.0
+        self.entity_names = entity_names
+        self.entity_choices = [utils.default_process(name) for name in entity_names]
+        self.entity_offsets = entity_offsets
+        self.entity_rows = entity_rows
+        self.k1 = k1
+        self.b = b
+
+    @property
+    def num_rows(self) -> int:
+        return len(self.doc_len)
+
+    @classmethod
+    def build(cls, records: List[Dict]) -> "LexicalIndex":
+        postings: Dict[str, Dict[int, int]] = {}
+        doc_len = np.zeros(len(records), dtype=np.float32)
+        entities: Dict[str, List[int]] = {}
+        for row, record in enumerate(records):
+            tokens = tokenize(lexical_text(record))
+            doc_len[row] = len(tokens)
+            for token in tokens:
+                counts = postings.setdefault(token, {})
+                counts[row] = counts.get(row, 0) + 1
+            name = _field(record, "title/entity_name")
+            if name:
+                entities.setdefault(name, []).append(row)
+        vocab = sorted(postings)
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum([len(postings[t]) for t in vocab], out=offsets[1:])
+        post_rows = np.fromiter((r for t in vocab for r in postings[t]), dtype=np.int32, count=int(offsets[-1]))
+        post_tfs = np.fromiter((c for t in vocab for c in postings[t].values()), dtype=np.float32, count=int(offsets[-1]))
+        entity_names = sorted(entities)
+        entity_offsets = np.zeros(len(entity_names) + 1, dtype=np.int64)
+        np.cumsum([len(entities[n]) for n in entity_names], out=entity_offsets[1:])
+        entity_rows = np.fromiter((r for n in entity_names for r in entities[n]), dtype=np.int32, count=int(entity_offsets[-1]))
+        return cls(vocab, offsets, post_rows, post_tfs, doc_len, entity_names, entity_offsets, entity_rows)
+
+    def save(self, path: str) -> None:
+        np.savez(
+            path,
+            vocab=np.array(self.vocab),
+            offsets=self.offsets,
+            post_rows=self.post_rows,
+            post_tfs=self.post_tfs,
+            doc_len=self.doc_len,
+            entity_names=np.array(self.entity_names),
+            entity_offsets=self.entity_offsets,
+            entity_rows=self.entity_rows,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        data = np.load(path)
+        return cls(
+            data["vocab"].tolist(),
+            data["offsets"],
+            data["post_rows"],
+            data["post_tfs"],
+            data["doc_len"],
+            data["entity_names"].tolist(),
+            data["entity_offsets"],
+            data["entity_rows"],
+        )
+
+    def bm25(self, query: str, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = np.zeros(self.num_rows, dtype=np.float32)
+        n = self.num_rows
+        for token in set(tokenize(query)):
+            term = self.term_ids.get(token)
+            if term is None:
+                continue
+            start, end = self.offsets[term], self.offsets[term + 1]
+            rows = self.post_rows[start:end]
+            tfs = self.post_tfs[start:end]
+            df = end - start
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self.doc_len[rows] / self.avg_len)
+            scores[rows] += idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+        matched = np.flatnonzero(scores)
+        order = top_k_indices(scores[matched], limit)
+        return matched[order], scores[matched[order]]
+
+    def fuzzy_entities(self, query: str, limit: int, score_cutoff: float) -> np.ndarray:
+        matches = process.extract(
+            utils.default_process(query),
+            self.entity_choices,
+            scorer=fuzz.WRatio,
+            limit=limit,
+            score_cutoff=score_cutoff,
+        )
+        rows: List[int] = []
+        for _, _, entity in matches:
+            rows.extend(self.entity_rows[self.entity_offsets[entity]:self.entity_offsets[entity + 1]].tolist())
+        return np.array(rows[:limit], dtype=np.int64)
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import os
+import json
+import mmap
+import shutil
+from typing import List, Dict, Iterable
+
+import numpy as np
+
+
+STORE_NAME = "metadata"
+
+
+class MetadataWriter:
+    # One append-only file per column holding JSON-encoded cells, plus an offsets table written on close.
+    def __init__(self, store_dir: str, columns: List[str]) -> None:
+        self.store_dir = store_dir
+        self.tmp_dir = store_dir + ".tmp"
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        os.makedirs(self.tmp_dir)
+        self.columns = columns
+        self.files = [open(os.path.join(self.tmp_dir, f"col{i}.bin"), "wb") for i in range(len(columns))]
+        # Cell lengths are kept as one int64 array per appended batch, so the writer's memory stays
+        # proportional to the batch rather than to the whole store.
+        self.lengths: List[List[np.ndarray]] = [[] for _ in columns]
+
+    def append(self, records: Iterable[Dict]) -> None:
+        records = list(records)
+        for i, column in enumerate(self.columns):
+            cells = [json.dumps(record.get(column), ensure_ascii=False).encode("utf-8") for record in records]
+            self.files[i].write(b"".join(cells))
+            self.lengths[i].append(np.fromiter(map(len, cells), dtype=np.int64, count=len(cells)))
+
+    def close(self) -> None:
+        for f in self.files:
+            f.close()
+        rows = sum(len(part) for part in self.lengths[0]) if self.lengths else 0
+        offsets = np.zeros((len(self.columns), rows + 1), dtype=np.int64)
+        for i, parts in enumerate(self.lengths):
+            if parts:
+                np.cumsum(np.concatenate(parts), out=offsets[i, 1:])
+        np.save(os.path.join(self.tmp_dir, "offsets.npy"), offsets)
+        with open(os.path.join(self.tmp_dir, "columns.json"), "w", encoding="utf-8") as f:
+            json.dump(self.columns, f, ensure_ascii=False)
+        old_dir = self.store_dir + ".old"
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.exists(self.store_dir):
+            os.replace(self.store_dir, old_dir)
+        os.replace(self.tmp_dir, self.store_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def write_metadata(store_dir: str, records: List[Dict]) -> None:
+    columns: List[str] = []
+    for record in records[:1]:
+        columns = list(record.keys())
+    writer = MetadataWriter(store_dir, columns)
+    writer.append(records)
+    writer.close()
+
+
+class MetadataStore:
+    # Opening maps the column files; a row dict is only built when it is indexed.
+    def __init__(self, store_dir: str) -> None:
+        with open(os.path.join(store_dir, "columns.json"), "r", encoding="utf-8") as f:
+            self.columns: List[str] = json.load(f)
+        self.offsets = np.asarray(np.load(os.path.join(store_dir, "offsets.npy"), mmap_mode="r"))
+        self.data: List[bytes | mmap.mmap] = []
+        for i in range(len(self.columns)):
+            with open(os.path.join(store_dir, f"col{i}.bin"), "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                self.data.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b"")
+
+    def __len__(self) -> int:
+        return self.offsets.shape[1] - 1
+
+    def cell(self, row: int, column: int):
+        start, end = int(self.offsets[column, row]), int(self.offsets[column, row + 1])
+        return json.loads(self.data[column][start:end].decode("utf-8"))
+
+    def __getitem__(self, row: int) -> Dict:
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return {column: self.cell(row, i) for i, column in enumerate(self.columns)}
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import json
+from typing import List, Dict, Iterable
+
+import numpy as np
+
+
+PARTITIONS_NAME = "partitions.json"
+PARTITION_FIELDS = ("Category", "Sub_Category")
+
+
+def _key(value) -> str | None:
+    if value is None or value != value:  # NaN cells belong to no partition
+        return None
+    return str(value)
+
+
+class PartitionBuilder:
+    # Records each field value's rows as [start, stop) runs in index order. Rows are appended in order,
+    # so a row either extends its value's last run or opens a new one; the CSV is mostly grouped by
+    # category, which keeps the run lists short without reordering the index.
+    def __init__(self, fields: Iterable[str] = PARTITION_FIELDS) -> None:
+        self.runs: Dict[str, Dict[str, List[List[int]]]] = {field: {} for field in fields}
+
+    def add(self, records: List[Dict], start: int = 0) -> None:
+        for field, table in self.runs.items():
+            for row, record in enumerate(records, start):
+                key = _key(record.get(field))
+                if key is None:
+                    continue
+                runs = table.setdefault(key, [])
+                if runs and runs[-1][1] == row:
+                    runs[-1][1] = row + 1
+                else:
+                    runs.append([row, row + 1])
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.runs, f, ensure_ascii=False)
+
+    def summary(self) -> str:
+        parts = []
+        for field, table in self.runs.items():
+            parts.append(f"{len(table)} {field} values in {sum(len(r) for r in table.values())} runs")
+        return ", ".join(parts)
+
+
+def union_runs(runs: List[np.ndarray]) -> np.ndarray:
+    runs = [r for r in runs if len(r)]
+    if not runs:
+        return np.empty((0, 2), dtype=np.int64)
+    merged = np.concatenate(runs)
+    merged = merged[np.argsort(merged[:, 0], kind="stable")]
+    out = [merged[0].tolist()]
+    for start, stop in merged[1:].tolist():
+        if start <= out[-1][1]:
+            out[-1][1] = max(out[-1][1], stop)
+        else:
+            out.append([start, stop])
+    return np.array(out, dtype=np.int64)
+
+
+def intersect_runs(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    out: List[List[int]] = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start, stop = max(a[i, 0], b[j, 0]), min(a[i, 1], b[j, 1])
+        if start < stop:
+            out.append([int(start), int(stop)])
+        if a[i, 1] < b[j, 1]:
+            i += 1
+        else:
+            j += 1
+    return np.array(out, dtype=np.int64).reshape(-1, 2)
+
+
+class Partitions:
+    def __init__(self, runs: Dict[str, Dict[str, np.ndarray]]) -> None:
+        self.runs = runs
+
+    @classmethod
+    def load(cls, path: str) -> "Partitions":
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        return cls({
+            field: {value: np.array(runs, dtype=np.int64).reshape(-1, 2) for value, runs in table.items()}
+            for field, table in raw.items()
+        })
+
+    def select(self, filters: Dict[str, str | List[str]]) -> np.ndarray:
+        # Values of one field are OR-ed, fields are AND-ed: {"Category": ["Placements", "Academics"]}.
+        selected: np.ndarray | None = None
+        for field, values in filters.items():
+            if field not in self.runs:
+                raise ValueError(f"Unknown filter field: {field} (partitioned fields: {', '.join(self.runs)})")
+            if isinstance(values, str):
+                values = [values]
+            runs = union_runs([self.runs[field].get(str(v), np.empty((0, 2), dtype=np.int64)) for v in values])
+            selected = runs if selected is None else intersect_runs(selected, runs)
+        if selected is None:
+            raise ValueError("Empty filters")
+        return selected
+
+    @staticmethod
+    def contains(runs: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        if not len(runs):
+            return np.zeros(len(rows), dtype=bool)
+        pos = np.searchsorted(runs[:, 0], rows, side="right") - 1
+        return (pos >= 0) & (rows < runs[np.maximum(pos, 0), 1])
+
+    @staticmethod
+    def rows(runs: np.ndarray) -> np.ndarray:
+        return np.concatenate([np.arange(start, stop) for start, stop in runs]) if len(runs) else np.empty(0, dtype=np.int64)
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import os
+from typing import Tuple
+
+import numpy as np
+
+
+EMBEDDING_DTYPES = ("float32", "float16", "int8")
+
+
+def load_matrix(path: str, mmap: bool) -> np.ndarray:
+    # A read-only mapping of the .npy file costs O(1) to open and is shared between processes via the page cache.
+    if mmap:
+        return np.asarray(np.load(path, mmap_mode="r"))
+    return np.load(path)
+
+
+def save_matrix(path: str, array: np.ndarray) -> None:
+    # Write to a new file and rename it into place: processes that still map the old file keep a valid copy.
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def create_matrix(path: str, shape: Tuple[int, ...], dtype) -> np.ndarray:
+    # Preallocated writable mapping of `path`.tmp; rows are filled in place and publish_matrix renames it.
+    return np.lib.format.open_memmap(path + ".tmp", mode="w+", dtype=dtype, shape=shape)
+
+
+def publish_matrix(path: str, array: np.ndarray) -> None:
+    array.flush()
+    os.replace(path + ".tmp", path)
+
+
+def truncate_normalize(vectors: np.ndarray, dim: int) -> np.ndarray:
+    # Matryoshka prefix: keep the first `dim` components and restore unit length.
+    prefix = np.asarray(vectors[..., :dim], dtype=np.float32)
+    return prefix / np.maximum(np.linalg.norm(prefix, axis=-1, keepdims=True), 1e-12)
+
+
+def reduced_path(index_dir: str, dim: int) -> str:
+    return os.path.join(index_dir, f"embeddings.d{dim}.npy")
+
+
+def write_reduced(embeddings: np.ndarray, dim: int, index_dir: str, block_size: int = 65536) -> np.ndarray:
+    path = reduced_path(index_dir, dim)
+    reduced = create_matrix(path, (len(embeddings), dim), np.float32)
+    for start in range(0, len(embeddings), block_size):
+        reduced[start:start + block_size] = truncate_normalize(embeddings[start:start + block_size], dim)
+    publish_matrix(path, reduced)
+    return reduced
+
+
+class QuantizedEmbeddings:
+    # Compact copy of the embedding matrix used for the first-pass scan; exact scores come from the float32 rows.
+    def __init__(self, dtype: str, data: np.ndarray, scales: np.ndarray | None = None) -> None:
+        self.dtype = dtype
+        self.data = data
+        self.scales = scales
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    @classmethod
+    def from_float(cls, embeddings: np.ndarray, dtype: str) -> "QuantizedEmbeddings":
+        if dtype == "float16":
+            return cls(dtype, embeddings.astype(np.float16))
+        if dtype == "int8":
+            # Per-dimension symmetric scaling keeps every column's full range in [-127, 127].
+            scales = np.abs(embeddings).max(axis=0).astype(np.float32) / 127.0
+            scales[scales == 0] = 1.0
+            data = np.clip(np.rint(embeddings / scales), -127, 127).astype(np.int8)
+            return cls(dtype, data, scales)
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
+    @classmethod
+    def write_blockwise(cls, embeddings: np.ndarray, dtype: str, index_dir: str, block_size: int = 65536) -> "QuantizedEmbeddings":
+        # Same files as from_float(...).save(), converted one block at a time so a memory-mapped
+        # matrix is never widened or copied whole.
+        if dtype not in EMBEDDING_DTYPES[1:]:
+            raise ValueError(f"Unsupported embedding dtype: {dtype}")
+        data_path, scales_path = cls.paths(index_dir, dtype)
+        scales = None
+        if dtype == "int8":
+            scales = np.zeros(embeddings.shape[1], dtype=np.float32)
+            for start in range(0, len(embeddings), block_size):
+                np.maximum(scales, np.abs(embeddings[start:start + block_size]).max(axis=0), out=scales)
+            scales = scales / 127.0
+            scales[scales == 0] = 1.0
+        data = create_matrix(data_path, embeddings.shape, np.float16 if dtype == "float16" else np.int8)
+        for start in range(0, len(embeddings), block_size):
+            block = embeddings[start:start + block_size]
+            if scales is None:
+                data[start:start + block_size] = block.astype(np.float16)
+            else:
+                data[start:start + block_size] = np.clip(np.rint(block / scales), -127, 127).astype(np.int8)
+        publish_matrix(data_path, data)
+        if scales is not None:
+            save_matrix(scales_path, scales)
+        return cls(dtype, data, scales)
+
+    @staticmethod
+    def paths(index_dir: str, dtype: str) -> Tuple[str, str]:
+        return (
+            os.path.join(index_dir, f"embeddings.{dtype}.npy"),
+            os.path.join(index_dir, f"embeddings.{dtype}_scales.npy"),
+        )
+
+    def save(self, index_dir: str) -> None:
+        data_path, scales_path = self.paths(index_dir, self.dtype)
+        save_matrix(data_path, self.data)
+        if self.scales is not None:
+            save_matrix(scales_path, self.scales)
+
+    @classmethod
+    def load(cls, index_dir: str, dtype: str, mmap: bool = False) -> "QuantizedEmbeddings | None":
+        data_path, scales_path = cls.paths(index_dir, dtype)
+        if not os.path.exists(data_path):
+            return None
+        scales = np.load(scales_path) if dtype == "int8" else None
+        return cls(dtype, load_matrix(data_path, mmap), scales)
+
+    def scores(self, query_vec: np.ndarray, rows: np.ndarray | None = None, block_size: int = 16384) -> np.ndarray:
+        # NumPy has no BLAS kernels for float16/int8, so widen one block at a time to bound the temporary copy.
+        # rows restricts scoring to a subset (e.g. the probed IVF lists), in that order.
+        query = query_vec.astype(np.float32)
+        if self.scales is not None:
+            query = query * self.scales
+        count = len(self.data) if rows is None else len(rows)
+        out = np.empty(count, dtype=np.float32)
+        for start in range(0, count, block_size):
+            if rows is None:
+                block = self.data[start:start + block_size].astype(np.float32)
+            else:
+                block = self.data[rows[start:start + block_size]].astype(np.float32)
+            out[start:start + block_size] = block @ query
+        return out
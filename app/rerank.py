@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import time
+from typing import List, Dict, Tuple
+
+from app.config import paths, index_cfg
+
+
+class Reranker:
+    # Cross-encoder second stage. Cost per (query, candidate) pair is tracked as a moving average and
+    # used to decide how many candidates fit in what is left of the request's latency budget.
+    def __init__(self, model_dir: str | None = None) -> None:
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_dir or paths.cross_encoder_dir)
+        self.ms_per_pair: float | None = None
+        self.reranked = 0
+        self.truncated = 0
+        self.skipped = 0
+
+    def warm_up(self) -> None:
+        start = time.perf_counter()
+        self.model.predict([("warm up", "warm up")] * 8, batch_size=8, show_progress_bar=False)
+        self.ms_per_pair = (time.perf_counter() - start) * 1000 / 8
+
+    def rerank_batch(
+        self,
+        queries: List[str],
+        candidates: List[List[Tuple[float, Dict]]],
+        started: float,
+        budget_ms: float | None = None,
+    ) -> List[List[Tuple[float, Dict]]]:
+        if budget_ms is None:
+            budget_ms = index_cfg.rerank_budget_ms
+        if self.ms_per_pair is None:
+            self.warm_up()
+        remaining_ms = budget_ms - (time.perf_counter() - started) * 1000
+        per_query = int(remaining_ms / (self.ms_per_pair * max(1, len(queries))))
+        if per_query < 2:
+            self.skipped += len(queries)
+            return candidates
+        pairs: List[Tuple[str, str]] = []
+        spans: List[Tuple[int, int]] = []
+        for query, hits in zip(queries, candidates):
+            n = min(per_query, len(hits))
+            if n < len(hits):
+                self.truncated += 1
+            spans.append((len(pairs), n))
+            pairs.extend((query, str(hit.get("context_text", ""))) for _, hit in hits[:n])
+        if not pairs:
+            return candidates
+        start = time.perf_counter()
+        scores = self.model.predict(pairs, batch_size=64, show_progress_bar=False)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.ms_per_pair = 0.8 * self.ms_per_pair + 0.2 * elapsed_ms / len(pairs)
+        self.reranked += len(queries)
+        reranked: List[List[Tuple[float, Dict]]] = []
+        for (offset, n), hits in zip(spans, candidates):
+            order = sorted(range(n), key=lambda i: -float(scores[offset + i]))
+            reranked.append([hits[i] for i in order] + hits[n:])
+        return reranked
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "reranked": self.reranked,
+            "truncated": self.truncated,
+            "skipped": self.skipped,
+            "ms_per_pair": self.ms_per_pair or 0.0,
+        }
@@ -1,37 +1,488 @@
 from __future__ import annotations
 
 import os
+import sys
 import json
+import time
+import atexit
+import threading
 from typing import List, Dict, Tuple
 
 import numpy as np
 from numpy.linalg import norm
-from sentence_transformers import SentenceTransformer
 
+from app.ann import IVFIndex, top_k_indices, top_k_rows
+from app.bundles import DEFAULT_CORPUS, corpus_root, current_version, read_manifest, resolve_index_dir, verify_bundle, version_dir
 from app.config import paths, index_cfg
+from app.data_utils import normalize_question
+from app.embed_cache import QueryEmbeddingCache, normalize_query
+from app.encoder import encoder_fingerprint, load_encoder
+from app.lexical import LexicalIndex, reciprocal_rank_fusion
+from app.metadata_store import STORE_NAME, MetadataStore
+from app.partitions import PARTITIONS_NAME, Partitions
+from app.quantize import QuantizedEmbeddings, load_matrix, reduced_path, truncate_normalize
+from app.rerank import Reranker
+from app.startup import profile
+
+
+def load_metadata(index_dir: str) -> MetadataStore | List[Dict]:
+    store_dir = os.path.join(index_dir, STORE_NAME)
+    if os.path.exists(os.path.join(store_dir, "offsets.npy")):
+        return MetadataStore(store_dir)
+    # Indexes built before the columnar store only have metadata.jsonl.
+    metadata: List[Dict] = []
+    with open(os.path.join(index_dir, "metadata.jsonl"), "r", encoding="utf-8") as f:
+        for line in f:
+            metadata.append(json.loads(line))
+    return metadata
+
+
+class IndexBundle:
+    # One opened index version. Searches take a reference to the bundle once, so a version published
+    # while they run is only picked up by later searches and every query sees one consistent set of files.
+    def __init__(self, index_dir: str) -> None:
+        self.index_dir = index_dir
+        manifest = read_manifest(index_dir) or {}
+        self.version: str | None = manifest.get("version")
+        self.model_fingerprint: str | None = manifest.get("model_fingerprint")
+        self.dataset_mtime: float | None = manifest.get("dataset_mtime")
+        self.compact: QuantizedEmbeddings | None = None
+        if index_cfg.embedding_dtype != "float32":
+            self.compact = QuantizedEmbeddings.load(index_dir, index_cfg.embedding_dtype, index_cfg.mmap_embeddings)
+        # With a compact copy the float32 rows are only read for rescoring, so they always stay on disk.
+        mmap = index_cfg.mmap_embeddings or self.compact is not None
+        self.embeddings = load_matrix(os.path.join(index_dir, "embeddings.npy"), mmap)
+        if self.compact is not None and len(self.compact) != len(self.embeddings):
+            self.compact = None
+        self.reduced: np.ndarray | None = None
+        dim = index_cfg.search_dim
+        if dim and os.path.exists(reduced_path(index_dir, dim)):
+            reduced = load_matrix(reduced_path(index_dir, dim), index_cfg.mmap_embeddings)
+            if len(reduced) == len(self.embeddings):
+                self.reduced = reduced
+        self.metadata = load_metadata(index_dir)
+        self.ivf: IVFIndex | None = None
+        ivf_path = os.path.join(index_dir, "ivf.npz")
+        if index_cfg.ann_type == "ivf" and len(self.embeddings) >= index_cfg.ann_min_rows and os.path.exists(ivf_path):
+            ivf = IVFIndex.load(ivf_path)
+            if len(ivf.row_ids) == len(self.embeddings):
+                self.ivf = ivf
+        self.lexical: LexicalIndex | None = None
+        lexical_path = os.path.join(index_dir, "lexical.npz")
+        if index_cfg.hybrid and os.path.exists(lexical_path):
+            lexical = LexicalIndex.load(lexical_path)
+            if lexical.num_rows == len(self.embeddings):
+                self.lexical = lexical
+        self.partitions: Partitions | None = None
+        partitions_path = os.path.join(index_dir, PARTITIONS_NAME)
+        if os.path.exists(partitions_path):
+            self.partitions = Partitions.load(partitions_path)
+        self.questions: Dict[str, List[int]] = {}
+        questions_path = os.path.join(index_dir, "questions.json")
+        if index_cfg.exact_match and os.path.exists(questions_path):
+            with open(questions_path, "r", encoding="utf-8") as f:
+                self.questions = json.load(f)
+
+    def scan(
+        self, query_vec: np.ndarray, top_k: int, nprobe: int | None = None, rescore: bool = True
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # The IVF index only narrows the rows to its probed lists; the reduced or compact matrix still does
+        # the first pass over them, and the best rescore_candidates are rescored in float32.
+        rows = self.ivf.candidates(query_vec, nprobe or index_cfg.ivf_nprobe) if self.ivf is not None else None
+        if self.reduced is not None:
+            reduced = self.reduced if rows is None else self.reduced[rows]
+            scores = reduced @ truncate_normalize(query_vec, self.reduced.shape[1])
+            rescore = rescore and index_cfg.search_dim_rescore
+        elif self.compact is not None:
+            scores = self.compact.scores(query_vec, rows)
+        else:
+            scores = (self.embeddings if rows is None else self.embeddings[rows]) @ query_vec
+            rescore = False
+        if not rescore:
+            top = top_k_indices(scores, top_k)
+            return (top if rows is None else rows[top]), scores[top]
+        top = top_k_indices(scores, max(top_k, index_cfg.rescore_candidates))
+        top = np.sort(top if rows is None else rows[top])  # sequential reads from the memory-mapped float32 matrix
+        scores = self.embeddings[top] @ query_vec
+        order = top_k_indices(scores, top_k)
+        return top[order], scores[order]
+
+    def lexical_ranks(self, query: str, n: int) -> List[np.ndarray]:
+        lexical_rows, _ = self.lexical.bm25(query, n)
+        return [lexical_rows, self.lexical.fuzzy_entities(query, n, index_cfg.fuzzy_score_cutoff)]
+
+    def dense_ranks(self, query_vec: np.ndarray, n: int, lexical: List[np.ndarray], rescore: bool = True) -> np.ndarray:
+        candidates = np.union1d(*lexical)
+        if index_cfg.lexical_prefilter and len(candidates):
+            return candidates[top_k_indices(self.embeddings[candidates] @ query_vec, n)]
+        return self.scan(query_vec, n, rescore=rescore)[0]
+
+    def fuse(
+        self, dense_rows: np.ndarray, lexical: List[np.ndarray], query_vec: np.ndarray, top_k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        rows, _ = reciprocal_rank_fusion([dense_rows, *lexical], index_cfg.rrf_k)
+        rows = rows[:top_k]
+        # Report the dense cosine so scores stay comparable with the non-hybrid path.
+        return rows, self.embeddings[rows] @ query_vec
+
+    def rank(self, query: str, query_vec: np.ndarray, top_k: int, rescore: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        if self.lexical is None:
+            return self.scan(query_vec, top_k, rescore=rescore)
+        n = max(top_k, index_cfg.lexical_candidates)
+        lexical = self.lexical_ranks(query, n)
+        return self.fuse(self.dense_ranks(query_vec, n, lexical, rescore), lexical, query_vec, top_k)
+
+    @property
+    def approximate(self) -> bool:
+        return self.ivf is not None or self.lexical is not None or self.compact is not None or self.reduced is not None
 
 
 class Retriever:
-    def __init__(self) -> None:
-        self.model = SentenceTransformer(paths.model_dir)
-        self.embeddings = np.load(os.path.join(paths.index_dir, "embeddings.npy"))
-        self.metadata: List[Dict] = []
-        with open(os.path.join(paths.index_dir, "metadata.jsonl"), "r", encoding="utf-8") as f:
-            for line in f:
-                self.metadata.append(json.loads(line))
-
-    def search(self, query: str, top_k: int | None = None) -> List[Tuple[float, Dict]]:
+    def __init__(self, watch: bool = False, corpora: List[str] | None = None) -> None:
+        # One encoder, query cache and re-ranker shared by every corpus; each corpus only adds its index.
+        # Without `corpora` the retriever serves the default index in paths.index_dir.
+        names = list(dict.fromkeys(corpora or [DEFAULT_CORPUS]))
+        self.roots = {name: corpus_root(name) for name in names}
+        self.default_corpus = names[0]
+        with profile.phase("load encoder"):
+            self.model = load_encoder()
+            self.fingerprint = encoder_fingerprint()
+        with profile.phase("open index"):
+            self.indexes = {name: IndexBundle(resolve_index_dir(root)) for name, root in self.roots.items()}
+        for name, bundle in self.indexes.items():
+            if bundle.model_fingerprint not in (None, self.fingerprint):
+                print(f"Corpus {name} was indexed with a different encoder; rebuild it for accurate scores", file=sys.stderr)
+        self.reranker: Reranker | None = None
+        if index_cfg.rerank and os.path.exists(os.path.join(paths.cross_encoder_dir, "config.json")):
+            with profile.phase("load re-ranker"):
+                self.reranker = Reranker()
+        self.exact_hits = 0
+        self.exact_encoded = 0
+        self.exact_misses = 0
+        self.stage_exits = {"exact": 0, "dense": 0, "full": 0}
+        self.query_cache = QueryEmbeddingCache(index_cfg.query_cache_size, self.fingerprint)
+        self.query_cache_path = os.path.join(paths.index_dir, "query_cache.npz")
+        if index_cfg.query_cache_persist:
+            self.query_cache.load(self.query_cache_path)
+            atexit.register(self.save_query_cache)
+        self.reloads = 0
+        self.reload_errors = 0
+        self.reload_lag_s = 0.0  # last swap: seconds from the dataset save to serving the rebuilt index
+        self._rejected: Dict[str, str] = {}
+        self._stop = threading.Event()
+        self._watcher: threading.Thread | None = None
+        if watch:
+            self.watch()
+
+    @property
+    def index(self) -> IndexBundle:
+        return self.indexes[self.default_corpus]
+
+    def bundle(self, corpus: str | None = None) -> IndexBundle:
+        corpus = corpus or self.default_corpus
+        if corpus not in self.indexes:
+            raise ValueError(f"Unknown corpus: {corpus} (served: {', '.join(self.indexes)})")
+        return self.indexes[corpus]
+
+    def watch(self, interval_s: float | None = None) -> None:
+        # Polls the CURRENT pointers from a daemon thread; opening and checking a new version happens
+        # on that thread, and the swap itself is one dict item assignment.
+        if self._watcher is not None:
+            return
+        interval_s = interval_s or index_cfg.reload_interval_s
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch_loop, args=(interval_s,), name="index-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch_loop(self, interval_s: float) -> None:
+        while not self._stop.wait(interval_s):
+            self.reload()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def reload(self) -> int:
+        return sum(self._reload_corpus(name) for name in self.roots)
+
+    def _reload_corpus(self, name: str) -> bool:
+        root, current = self.roots[name], self.indexes[name]
+        version = current_version(root)
+        if version is None or version in (current.version, self._rejected.get(name)):
+            return False
+        index_dir = version_dir(version, root)
+        try:
+            problems = verify_bundle(index_dir) if index_cfg.reload_verify else []
+            if problems:
+                raise ValueError("; ".join(problems[:3]))
+            bundle = IndexBundle(index_dir)
+            if bundle.model_fingerprint != self.fingerprint:
+                raise ValueError("built with a different encoder; restart to load the new model")
+        except (OSError, ValueError) as exc:
+            # Not retried until the pointer moves again.
+            self._rejected[name] = version
+            self.reload_errors += 1
+            print(f"Keeping {name} index version {current.version}; cannot load {version}: {exc}", file=sys.stderr)
+            return False
+        self.indexes[name] = bundle
+        self.reloads += 1
+        if bundle.dataset_mtime is not None:
+            self.reload_lag_s = time.time() - bundle.dataset_mtime
+        return True
+
+    def save_query_cache(self) -> None:
+        self.query_cache.save(self.query_cache_path)
+
+    def stats(self) -> Dict[str, float]:
+        exact_total = self.exact_hits + self.exact_encoded + self.exact_misses
+        return {
+            "exact_hits": self.exact_hits,
+            "exact_encoded": self.exact_encoded,
+            "exact_misses": self.exact_misses,
+            "exact_hit_rate": self.exact_hits / exact_total if exact_total else 0.0,
+            **{f"query_cache_{k}": v for k, v in self.query_cache.stats().items()},
+            **({f"cascade_exit_{k}": v for k, v in self.stage_exits.items()} if index_cfg.cascade else {}),
+            **({f"rerank_{k}": v for k, v in self.reranker.stats().items()} if self.reranker is not None else {}),
+            "index_rows": sum(len(bundle.embeddings) for bundle in self.indexes.values()),
+            **({f"corpus_{name}_rows": len(bundle.embeddings) for name, bundle in self.indexes.items()} if len(self.indexes) > 1 else {}),
+            "index_reloads": self.reloads,
+            "index_reload_errors": self.reload_errors,
+            "index_reload_lag_s": self.reload_lag_s,
+        }
+
+    def exact_lookup(
+        self, query: str, top_k: int, runs: np.ndarray | None = None, ix: IndexBundle | None = None
+    ) -> List[Tuple[float, Dict]] | None:
+        ix = ix or self.index
+        if not ix.questions:
+            return None
+        rows = ix.questions.get(normalize_question(query))
+        if rows is not None and runs is not None:
+            rows = [idx for idx, keep in zip(rows, Partitions.contains(runs, np.asarray(rows))) if keep] or None
+        if rows is None:
+            return None
+        return [(1.0, ix.metadata[idx]) for idx in rows[:top_k]]
+
+    def _exact_batch(
+        self, ix: IndexBundle, queries: List[str], top_k: int, runs: np.ndarray | None, matched: List[bool | None]
+    ) -> List[List[Tuple[float, Dict]] | None]:
+        # matched[i] becomes True once query i has an exact match in any corpus of the request; it stays
+        # None when no corpus has a question table, so exact_match=False counts neither hits nor misses.
+        batch = [self.exact_lookup(q, top_k, runs, ix) for q in queries]
+        if ix.questions:
+            for i, results in enumerate(batch):
+                matched[i] = bool(matched[i]) or results is not None
+        return batch
+
+    def _count_exact(self, queries: List[str], matched: List[bool | None], memo: Dict[str, np.ndarray]) -> None:
+        # Only matches answered without a query vector count as hits; memo holds every query that was
+        # encoded for this request (exact_pad, or a miss in another corpus).
+        for query, m in zip(queries, matched):
+            if m is None:
+                continue
+            if not m:
+                self.exact_misses += 1
+            elif query in memo:
+                self.exact_encoded += 1
+            else:
+                self.exact_hits += 1
+
+    @staticmethod
+    def _needs_dense(results: List[Tuple[float, Dict]] | None, top_k: int) -> bool:
+        return results is None or (index_cfg.exact_pad and len(results) < top_k)
+
+    @staticmethod
+    def _pad_exact(
+        exact: List[Tuple[float, Dict]] | None, results: List[Tuple[float, Dict]], top_k: int
+    ) -> List[Tuple[float, Dict]]:
+        # Exact hits come first; with exact_pad and fewer than top_k of them, the dense hits fill the rest.
+        if exact is None:
+            return results[:top_k]
+        matched = [record for _, record in exact]
+        return (exact + [hit for hit in results if hit[1] not in matched])[:top_k]
+
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        keys = [normalize_query(q) for q in queries]
+        vecs: List[np.ndarray | None] = [self.query_cache.get(k) for k in keys]
+        missing = sorted({k for k, v in zip(keys, vecs) if v is None})
+        if missing:
+            encoded = self.model.encode(missing, batch_size=64, normalize_embeddings=True)
+            fresh = dict(zip(missing, encoded))
+            for key, vec in fresh.items():
+                self.query_cache.put(key, vec)
+            vecs = [fresh[k] if v is None else v for k, v in zip(keys, vecs)]
+        return np.stack(vecs)
+
+    def _query_vecs(self, queries: List[str], memo: Dict[str, np.ndarray]) -> np.ndarray:
+        # Encodes each query at most once per request, however many corpora it is scored against.
+        missing = [q for q in dict.fromkeys(queries) if q not in memo]
+        if missing:
+            memo.update(zip(missing, self.encode_queries(missing)))
+        return np.stack([memo[q] for q in queries])
+
+    def search(
+        self, query: str, top_k: int | None = None, filters: Dict | None = None, corpus: str | None = None
+    ) -> List[Tuple[float, Dict]]:
+        return self.search_batch([query], top_k, filters, corpus)[0]
+
+    def search_batch(
+        self, queries: List[str], top_k: int | None = None, filters: Dict | None = None, corpus: str | None = None
+    ) -> List[List[Tuple[float, Dict]]]:
+        memo: Dict[str, np.ndarray] = {}
+        matched: List[bool | None] = [None] * len(queries)
+        batch = self._search(self.bundle(corpus), queries, top_k, filters, memo, matched)
+        self._count_exact(queries, matched, memo)
+        return batch
+
+    def search_corpora(
+        self, queries: List[str], corpora: List[str] | None = None, top_k: int | None = None, filters: Dict | None = None
+    ) -> List[Dict[str, List[Tuple[float, Dict]]]]:
+        # Per query, the hits of each corpus (all served corpora by default). Scores come from the same
+        # encoder, so hits can be compared across corpora.
+        bundles = {name: self.bundle(name) for name in (corpora or self.indexes)}
+        memo: Dict[str, np.ndarray] = {}
+        matched: List[bool | None] = [None] * len(queries)
+        results = {
+            name: self._search(bundle, queries, top_k, filters, memo, matched) for name, bundle in bundles.items()
+        }
+        self._count_exact(queries, matched, memo)
+        return [{name: hits[i] for name, hits in results.items()} for i in range(len(queries))]
+
+    def _search(
+        self,
+        ix: IndexBundle,
+        queries: List[str],
+        top_k: int | None,
+        filters: Dict | None,
+        memo: Dict[str, np.ndarray],
+        matched: List[bool | None],
+    ) -> List[List[Tuple[float, Dict]]]:
+        started = time.perf_counter()
         if top_k is None:
             top_k = index_cfg.top_k
-        query_vec = self.model.encode([query], normalize_embeddings=True)[0]
-        scores = self.embeddings @ query_vec
-        if top_k >= len(scores):
-            top_indices = np.argsort(-scores)
+        if filters:
+            return self._search_filtered(ix, queries, top_k, filters, started, memo, matched)
+        batch = self._exact_batch(ix, queries, top_k, None, matched)
+        if index_cfg.cascade:
+            return self._cascade(ix, queries, batch, top_k, started, memo)
+        pending = [i for i, results in enumerate(batch) if self._needs_dense(results, top_k)]
+        if not pending:
+            return batch
+        # With a re-ranker, fetch a deeper candidate list and let the cross-encoder pick the final top_k.
+        depth = max(top_k, index_cfg.rerank_candidates) if self.reranker is not None else top_k
+        query_vecs = self._query_vecs([queries[i] for i in pending], memo)
+        if ix.approximate:
+            hits = [ix.rank(queries[i], q, depth) for i, q in zip(pending, query_vecs)]
         else:
-            top_indices = np.argpartition(-scores, top_k)[:top_k]
-            top_indices = top_indices[np.argsort(-scores[top_indices])]
-        results: List[Tuple[float, Dict]] = []
-        for idx in top_indices:
-            results.append((float(scores[idx]), self.metadata[int(idx)]))
-        return results
+            scores = query_vecs @ ix.embeddings.T
+            top_indices = top_k_rows(scores, depth)
+            top_scores = np.take_along_axis(scores, top_indices, axis=1)
+            hits = list(zip(top_indices, top_scores))
+        candidates = [
+            [(float(score), ix.metadata[int(idx)]) for idx, score in zip(indices, scores_row)]
+            for indices, scores_row in hits
+        ]
+        if self.reranker is not None:
+            candidates = self.reranker.rerank_batch([queries[i] for i in pending], candidates, started)
+        for i, results in zip(pending, candidates):
+            batch[i] = self._pad_exact(batch[i], results, top_k)
+        return batch
+
+    def _search_filtered(
+        self,
+        ix: IndexBundle,
+        queries: List[str],
+        top_k: int,
+        filters: Dict,
+        started: float,
+        memo: Dict[str, np.ndarray],
+        matched: List[bool | None],
+    ) -> List[List[Tuple[float, Dict]]]:
+        # Scores only the selected partitions' rows, read as contiguous slices of the float32 matrix.
+        # Partitions are small enough that the ANN, compact, lexical and cascade paths are not used.
+        if ix.partitions is None:
+            raise ValueError("This index has no partitions; rebuild it to search with filters")
+        runs = ix.partitions.select(filters)
+        batch = self._exact_batch(ix, queries, top_k, runs, matched)
+        pending = [i for i, results in enumerate(batch) if self._needs_dense(results, top_k)]
+        if not pending:
+            return batch
+        if not len(runs):
+            for i in pending:
+                batch[i] = batch[i] or []
+            return batch
+        depth = max(top_k, index_cfg.rerank_candidates) if self.reranker is not None else top_k
+        query_vecs = self._query_vecs([queries[i] for i in pending], memo)
+        scores = np.hstack([query_vecs @ ix.embeddings[start:stop].T for start, stop in runs])
+        rows = Partitions.rows(runs)
+        top_indices = top_k_rows(scores, depth)
+        candidates = [
+            [(float(scores_row[j]), ix.metadata[int(rows[j])]) for j in order]
+            for order, scores_row in zip(top_indices, scores)
+        ]
+        if self.reranker is not None:
+            candidates = self.reranker.rerank_batch([queries[i] for i in pending], candidates, started)
+        for i, results in zip(pending, candidates):
+            batch[i] = self._pad_exact(batch[i], results, top_k)
+        return batch
 
+    def _cascade(
+        self,
+        ix: IndexBundle,
+        queries: List[str],
+        batch: List[List[Tuple[float, Dict]] | None],
+        top_k: int,
+        started: float,
+        memo: Dict[str, np.ndarray],
+    ) -> List[List[Tuple[float, Dict]]]:
+        # Stage 1: exact question match (already in batch), no encoder. There is no fuzzy variant: the
+        # dataset's templated questions differ by a year or a company name, well within any useful ratio.
+        # Every exact match exits here; with exact_pad, short ones are still padded from the later stages
+        # without being counted again.
+        self.stage_exits["exact"] += sum(results is not None for results in batch)
+        pending = [i for i, results in enumerate(batch) if self._needs_dense(results, top_k)]
+        if not pending:
+            return batch
+        # Stage 2: dense search over the compact index; exit when the winner is clear.
+        depth = max(top_k, index_cfg.rerank_candidates, 2)
+        query_vecs = self._query_vecs([queries[i] for i in pending], memo)
+        uncertain: List[Tuple[int, np.ndarray, List[np.ndarray] | None, np.ndarray]] = []
+        for i, query_vec in zip(pending, query_vecs):
+            lexical = None
+            if ix.lexical is None:
+                rows, scores = ix.scan(query_vec, depth, rescore=False)
+                dense_rows = rows
+            else:
+                n = max(depth, index_cfg.lexical_candidates)
+                lexical = ix.lexical_ranks(queries[i], n)
+                dense_rows = ix.dense_ranks(query_vec, n, lexical, rescore=False)
+                rows, scores = ix.fuse(dense_rows, lexical, query_vec, depth)
+            # Fused hits are listed in RRF order, so the margin is taken between the two best cosines.
+            best = np.sort(scores)[::-1]
+            if len(best) < 2 or best[0] - best[1] >= index_cfg.cascade_margin:
+                self.stage_exits["dense"] += batch[i] is None
+                hits = [(float(s), ix.metadata[int(r)]) for r, s in zip(rows[:top_k], scores[:top_k])]
+                batch[i] = self._pad_exact(batch[i], hits, top_k)
+            else:
+                uncertain.append((i, dense_rows, lexical, query_vec))
+        if not uncertain:
+            return batch
+        # Stage 3: full-precision rescoring of the dense candidates (re-fused with the lexical ranks in
+        # hybrid mode), then cross-encoder re-ranking if configured.
+        candidates: List[List[Tuple[float, Dict]]] = []
+        for _, dense_rows, lexical, query_vec in uncertain:
+            scores = ix.embeddings[dense_rows] @ query_vec
+            order = np.argsort(-scores, kind="stable")
+            if lexical is None:
+                rows, scores = dense_rows[order], scores[order]
+            else:
+                rows, scores = ix.fuse(dense_rows[order], lexical, query_vec, depth)
+            candidates.append([(float(score), ix.metadata[int(row)]) for row, score in zip(rows, scores)])
+        if self.reranker is not None:
+            candidates = self.reranker.rerank_batch([queries[i] for i, _, _, _ in uncertain], candidates, started)
+        for (i, _, _, _), results in zip(uncertain, candidates):
+            self.stage_exits["full"] += batch[i] is None
+            batch[i] = self._pad_exact(batch[i], results, top_k)
+        return batch
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import json
+import math
+import asyncio
+import argparse
+from typing import List, Dict, Tuple
+
+from app.config import index_cfg, server_cfg
+from app.retriever import Retriever
+
+
+def json_safe(value):
+    # Blank CSV cells come back from the metadata store as NaN, which is not valid JSON; send null instead.
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {k: json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(v) for v in value]
+    return value
+
+
+class MicroBatcher:
+    # Queries that arrive within max_wait_ms of each other share one encode + matmul.
+    def __init__(self, retriever: Retriever, max_batch_size: int, max_wait_ms: float) -> None:
+        self.retriever = retriever
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.batches = 0
+        self.queries = 0
+
+    async def search(
+        self, query: str, top_k: int, filters: Dict | None = None, corpus: str | List[str] | None = None
+    ) -> List[Tuple[float, Dict]] | Dict[str, List[Tuple[float, Dict]]]:
+        # A list of corpora returns {corpus: hits}, with the query encoded once for all of them.
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((query, top_k, filters or None, corpus, future))
+        return await future
+
+    def _search_group(self, queries: List[str], top_k: int, filters: Dict | None, corpus: str | List[str] | None):
+        if isinstance(corpus, list):
+            return self.retriever.search_corpora(queries, corpus, top_k, filters)
+        return self.retriever.search_batch(queries, top_k, filters, corpus)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            try:
+                await self._run_batch(loop, items)
+            except asyncio.CancelledError:
+                for *_, future in items:
+                    future.cancel()
+                raise
+            except Exception as exc:
+                # Whatever failed, no request in this batch is left waiting for an answer.
+                for *_, future in items:
+                    if not future.done():
+                        future.set_exception(exc)
+
+    async def _run_batch(self, loop: asyncio.AbstractEventLoop, items: List[Tuple]) -> None:
+        deadline = loop.time() + self.max_wait
+        while len(items) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Queries with different filters or corpora search different rows, so each is its own batch.
+        groups: Dict[str, List[Tuple]] = {}
+        for item in items:
+            groups.setdefault(json.dumps([item[2], item[3]], sort_keys=True), []).append(item)
+        for group in groups.values():
+            queries = [query for query, _, _, _, _ in group]
+            top_k = max(k for _, k, _, _, _ in group)
+            _, _, filters, corpus, _ = group[0]
+            try:
+                # The retriever is only ever used from this one executor call at a time.
+                results = await loop.run_in_executor(None, self._search_group, queries, top_k, filters, corpus)
+            except Exception as exc:
+                for _, _, _, _, future in group:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            if len(results) != len(group):
+                raise RuntimeError(f"search returned {len(results)} results for {len(group)} queries")
+            self.batches += 1
+            self.queries += len(group)
+            for (_, k, _, _, future), hits in zip(group, results):
+                if not future.done():
+                    trimmed = {name: h[:k] for name, h in hits.items()} if isinstance(hits, dict) else hits[:k]
+                    future.set_result(trimmed)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch_size": self.queries / self.batches if self.batches else 0.0,
+        }
+
+
+class RetrievalServer:
+    # Minimal HTTP/1.1 JSON API with keep-alive: POST /search, POST /search_batch, GET /stats.
+    def __init__(self, retriever: Retriever, max_batch_size: int, max_wait_ms: float) -> None:
+        self.retriever = retriever
+        self.batcher = MicroBatcher(retriever, max_batch_size, max_wait_ms)
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> Tuple[str, Dict]:
+        if method == "GET" and path == "/stats":
+            return "200 OK", {**self.retriever.stats(), **self.batcher.stats()}
+        if method != "POST" or path not in {"/search", "/search_batch"}:
+            return "404 Not Found", {"error": f"{method} {path} not found"}
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            return "400 Bad Request", {"error": "invalid JSON body"}
+        top_k = int(payload.get("top_k") or index_cfg.top_k)
+        filters = payload.get("filters") or None
+        if filters is not None and not isinstance(filters, dict):
+            return "400 Bad Request", {"error": "filters must be an object, e.g. {\"Category\": \"Placements\"}"}
+        corpus = payload.get("corpus") or None
+        if corpus is not None and not isinstance(corpus, (str, list)):
+            return "400 Bad Request", {"error": "corpus must be a corpus name or a list of names"}
+        try:
+            if path == "/search":
+                results = await self.batcher.search(str(payload.get("query", "")), top_k, filters, corpus)
+                return "200 OK", {"results": results}
+            queries = [str(q) for q in payload.get("queries", [])]
+            results = await asyncio.gather(*(self.batcher.search(q, top_k, filters, corpus) for q in queries))
+        except ValueError as exc:
+            return "400 Bad Request", {"error": str(exc)}
+        return "200 OK", {"results": list(results)}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                try:
+                    status, payload = await self.dispatch(method, path, body)
+                except Exception as exc:
+                    status, payload = "500 Internal Server Error", {"error": str(exc)}
+                try:
+                    data = json.dumps(json_safe(payload), ensure_ascii=False, allow_nan=False).encode("utf-8")
+                except ValueError as exc:
+                    status = "500 Internal Server Error"
+                    data = json.dumps({"error": f"response is not valid JSON: {exc}"}).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode("latin-1")
+                    + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int) -> None:
+        batch_task = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Retrieval server listening on http://{host}:{port}")
+        async with server:
+            try:
+                await server.serve_forever()
+            finally:
+                batch_task.cancel()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve one Retriever to local chat/voice clients")
+    parser.add_argument("--host", default=server_cfg.host)
+    parser.add_argument("--port", type=int, default=server_cfg.port)
+    parser.add_argument("--max-batch-size", type=int, default=server_cfg.max_batch_size)
+    parser.add_argument("--max-wait-ms", type=float, default=server_cfg.max_wait_ms)
+    parser.add_argument("--watch", action="store_true", help="serve newly published index versions without a restart")
+    parser.add_argument("--corpus", action="append", metavar="NAME",
+                        help="serve a named corpus from Paths.corpora (repeatable; the first is the default)")
+    args = parser.parse_args()
+
+    server = RetrievalServer(Retriever(watch=args.watch, corpora=args.corpus), args.max_batch_size, args.max_wait_ms)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import sys
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+# Imported first by the CLIs, so this approximates the start of app code (interpreter start-up is not included).
+_START = time.perf_counter()
+
+HEAVY_MODULES = ("numpy", "pandas", "torch", "transformers", "sentence_transformers", "rapidfuzz", "pyaudio", "requests")
+
+
+class StartupProfile:
+    def __init__(self) -> None:
+        self.enabled = False
+        self.phases: List[Tuple[str, float, int]] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        modules_before = len(sys.modules)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, (time.perf_counter() - start) * 1000, len(sys.modules) - modules_before))
+
+    def report(self) -> None:
+        if not self.enabled:
+            return
+        print(f"{'phase':<28}{'ms':>10}{'new modules':>13}", file=sys.stderr)
+        for name, ms, modules in self.phases:
+            print(f"{name:<28}{ms:>10.1f}{modules:>13}", file=sys.stderr)
+        print(f"{'total since app import':<28}{(time.perf_counter() - _START) * 1000:>10.1f}", file=sys.stderr)
+        loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+        print(f"heavy modules loaded: {', '.join(loaded) or 'none'}", file=sys.stderr)
+
+
+profile = StartupProfile()
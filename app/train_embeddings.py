@@ -40,6 +40,11 @@ def train_model() -> str:
     train_examples = prepare_training_data(train_cfg.max_train_pairs)
     train_dataloader = DataLoader(train_examples, shuffle=True, batch_size=train_cfg.train_batch_size)
     train_loss = losses.MultipleNegativesRankingLoss(model)
+    if train_cfg.matryoshka_dims:
+        # The full size is always one of the trained prefixes, so untruncated search does not regress.
+        full_dim = getattr(model, "get_embedding_dimension", model.get_sentence_embedding_dimension)()
+        dims = sorted({d for d in train_cfg.matryoshka_dims if d < full_dim} | {full_dim}, reverse=True)
+        train_loss = losses.MatryoshkaLoss(model, train_loss, matryoshka_dims=dims)
 
     num_steps_per_epoch = math.ceil(len(train_examples) / train_cfg.train_batch_size)
     warmup_steps = max(1, int(num_steps_per_epoch * train_cfg.train_epochs * train_cfg.warmup_ratio))
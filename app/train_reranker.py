@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import math
+import random
+from typing import List, Tuple
+
+from sentence_transformers import CrossEncoder, InputExample
+from torch.utils.data import DataLoader
+
+from app.config import paths, train_cfg, ensure_directories
+from app.data_utils import load_dataset, expand_training_pairs
+from app.train_embeddings import set_seed
+
+
+def prepare_reranker_data(max_pairs: int | None, negatives: int) -> List[InputExample]:
+    df = load_dataset(paths.data_path)
+    pairs: List[Tuple[str, str]] = expand_training_pairs(df, max_pairs=max_pairs)
+    contexts = sorted({c for _, c in pairs})
+    rng = random.Random(train_cfg.seed)
+    examples: List[InputExample] = []
+    for q, c in pairs:
+        examples.append(InputExample(texts=[q, c], label=1.0))
+        for _ in range(negatives):
+            negative = rng.choice(contexts)
+            if negative != c:
+                examples.append(InputExample(texts=[q, negative], label=0.0))
+    return examples
+
+
+def train_reranker() -> str:
+    ensure_directories()
+    set_seed(train_cfg.seed)
+
+    model = CrossEncoder(train_cfg.base_cross_encoder_model, num_labels=1)
+
+    train_examples = prepare_reranker_data(train_cfg.max_reranker_pairs, train_cfg.reranker_negatives)
+    train_dataloader = DataLoader(train_examples, shuffle=True, batch_size=train_cfg.train_batch_size)
+
+    num_steps_per_epoch = math.ceil(len(train_examples) / train_cfg.train_batch_size)
+    warmup_steps = max(1, int(num_steps_per_epoch * train_cfg.reranker_epochs * train_cfg.warmup_ratio))
+
+    model.fit(
+        train_dataloader=train_dataloader,
+        epochs=train_cfg.reranker_epochs,
+        warmup_steps=warmup_steps,
+        show_progress_bar=True,
+        optimizer_params={"lr": train_cfg.learning_rate},
+        output_path=paths.cross_encoder_dir,
+    )
+    model.save(paths.cross_encoder_dir)
+
+    return paths.cross_encoder_dir
+
+
+if __name__ == "__main__":
+    out = train_reranker()
+    print(f"Re-ranker trained and saved to: {out}")
@@ -1,12 +1,11 @@
 from __future__ import annotations
 
+from app.startup import profile
+
 import argparse
 import json
 from typing import Optional
 
-from app.voice_speech import list_input_devices
-from app.voice_wake_and_chat import voice_chat
-
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Voice utilities for Arya Chatbot")
@@ -14,15 +13,26 @@ def main() -> None:
     parser.add_argument("--voice-chat", action="store_true", help="Start voice chat with wake phrase")
     parser.add_argument("--device", type=int, default=None, help="Input device index to use")
     parser.add_argument("--debug", action="store_true", help="Print partial ASR results while listening")
+    parser.add_argument("--server", action="store_true", help="Query a running `python -m app.server` instead of loading the model")
+    parser.add_argument("--startup-profile", action="store_true", help="Print an import/initialisation time breakdown")
     parser.add_argument("--google-api-key", type=str, default=None, help="Path to Google Cloud service account JSON file")
     args = parser.parse_args()
+    profile.enabled = args.startup_profile
 
+    # Only import what the chosen command needs: device listing must not pull in torch.
     if args.list_audio:
-        print(json.dumps(list_input_devices(), indent=2))
+        with profile.phase("import voice_speech"):
+            from app.voice_speech import list_input_devices
+        with profile.phase("list devices"):
+            devices = list_input_devices()
+        print(json.dumps(devices, indent=2))
+        profile.report()
         return
 
     if args.voice_chat:
-        voice_chat(device_index=args.device, debug=args.debug, google_api_key=args.google_api_key)
+        with profile.phase("import voice chat"):
+            from app.voice_wake_and_chat import voice_chat
+        voice_chat(device_index=args.device, debug=args.debug, google_api_key=args.google_api_key, use_server=args.server)
         return
 
     parser.print_help()
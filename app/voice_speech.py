@@ -5,7 +5,6 @@ from __future__ import annotations
 
 import os
 import tempfile
-import requests
 import json
 import base64
 import time
@@ -379,7 +378,8 @@ class SpeechRecognizer:
                 }
             }
             
-            # Make API request
+            # Make API request (requests is imported here so device listing stays fast)
+            import requests
             headers = {'Content-Type': 'application/json'}
             response = requests.post(
                 self.api_url,
@@ -4,7 +4,7 @@ from rich.console import Console
 from rich.panel import Panel
 
 from app.config import voice_cfg
-from app.retriever import Retriever
+from app.startup import profile
 from app.voice_speech import SpeechRecognizer, TextToSpeech, list_input_devices
 
 
@@ -23,11 +23,18 @@ def correct_text(text: str) -> str:
     return text
 
 
-def voice_chat(device_index: int | None = None, debug: bool = False, google_api_key: str | None = None) -> None:
+def voice_chat(device_index: int | None = None, debug: bool = False, google_api_key: str | None = None, use_server: bool = False) -> None:
     console = Console()
     tts = TextToSpeech()
     asr = SpeechRecognizer(device_index=device_index, debug=debug, api_key=google_api_key)
-    retriever = Retriever()
+    if use_server:
+        from app.client import RetrievalClient
+        retriever = RetrievalClient()
+    else:
+        with profile.phase("import retriever"):
+            from app.retriever import Retriever
+        retriever = Retriever()
+    profile.report()
 
     greeting = "Hello, my name is Arya Chatbot. I'm ready to answer your questions!"
     console.print(Panel(greeting, title="Voice Chat Ready"))